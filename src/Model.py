@@ -1,15 +1,22 @@
+import os
+from urllib.error import URLError
+
 import streamlit as st
-from joblib import load
 import pandas as pd
 import plotly.express as px  # For interactive charts
-from analytics import create_roastlevel_analysis_chart, bubble_chart, roast_top10
-from data_processing import preprocess_data, preprocess_for_roastlevel_analysis, preprocess_for_roast_top10, load_data
+from app_cache import get_bubble_chart_spec, get_encodings, get_model, get_prediction_table, get_price_sweep_spec
+from instrumentation import incr, profile, span
+from prediction_service import predict_remote
+from prediction_table import PRICE_MAX, PRICE_MIN, PRICE_STEP
+from scoring import adjust_prediction_for_price_outliers
+
+# Set to the prediction service's address (e.g. http://127.0.0.1:8600) to predict through it
+PREDICTION_URL = os.environ.get('COFFEE_PREDICTION_URL')
 
 
-# Load your model and encoding dictionaries
-model = load('models/your_model.joblib')
-origin_means = load('models/origin_means.joblib')
-roastlevel_means = load('models/roastlevel_means.joblib')
+# Load the encoding dictionaries (shared by all sessions, reloaded when the files change); the model
+# itself is only loaded when a prediction can't be answered from the precomputed table
+origin_means, roastlevel_means = get_encodings()
 
 # Title and introduction
 st.title('Welcome to the Saigon Bean Bazaar Sales Estimator!')
@@ -35,35 +42,55 @@ origin_input = st.selectbox('Select Origin', options=list(origin_means.keys()),
                             help='Choose the origin of the coffee bean.')
 roast_level_input = st.selectbox('Select Roast Level', options=list(roastlevel_means.keys()), 
                                  help='Choose the roast level.')
-price = st.slider('Price ($)', min_value=5.0, max_value=60.0, value=30.0, step=0.5,
+price = st.slider('Price ($)', min_value=PRICE_MIN, max_value=PRICE_MAX, value=30.0, step=PRICE_STEP,
                   help='Set the price of the coffee bean.')
     
+# What-if: the prediction across the whole price range for the selected origin and roast level, cached per
+# selection and only computed once the user asks for it
+if st.toggle('Explore prices for this origin and roast level'):
+    st.plotly_chart(get_price_sweep_spec(origin_input, roast_level_input))
+    st.markdown("""
+        The chart shows the predicted performance at every price from ${:.0f} to ${:.0f}. Hover over a point to see the model's confidence in each category. Use it to find the price ranges where the prediction changes before settling on a price.
+    """.format(PRICE_MIN, PRICE_MAX))
+
 # Prediction and display results directly
 if st.button('Predict'):
-    origin_encoded = origin_means[origin_input]
-    roast_level_encoded = roastlevel_means[roast_level_input]
-    
-    # Create a DataFrame with the correct feature names and the input data
-    input_data = pd.DataFrame({
-        'Origin_TargetEncoded': [origin_encoded],
-        'RoastLevel_TargetEncoded': [roast_level_encoded],
-        'Price': [price]
-    })
-    
-    # Use the DataFrame for prediction
-    raw_prediction = model.predict(input_data)
-    
-    # Function to adjust the prediction based on price outliers
-    def adjust_prediction_for_price_outliers(prediction, price, high_price_threshold=40, low_price_threshold=10):
-        if price > high_price_threshold:
-            return 'Low'
-        elif price < low_price_threshold:
-            return 'High'
+    # Timed (and profiled with COFFEE_METRICS=profile) for the diagnostics page
+    with span('predict'), profile('predict'):
+        prediction_table = get_prediction_table()
+        table_result = prediction_table.lookup(origin_input, roast_level_input, price) if prediction_table is not None else None
+
+        remote_prediction = None
+        if table_result is None and PREDICTION_URL:
+            try:
+                remote_prediction = predict_remote(PREDICTION_URL, origin_input, roast_level_input, price)['Prediction']
+            except (URLError, OSError, ValueError):
+                # Fall back to the local model when the service is unreachable
+                remote_prediction = None
+
+        if table_result is not None:
+            raw_prediction = table_result[0]
+            incr('predict.table')
+        elif remote_prediction is not None:
+            raw_prediction = remote_prediction
+            incr('predict.remote')
         else:
-            return prediction
-    
-    # Adjust the prediction based on the price outliers
-    adjusted_prediction = adjust_prediction_for_price_outliers(raw_prediction[0], price)
+            origin_encoded = origin_means[origin_input]
+            roast_level_encoded = roastlevel_means[roast_level_input]
+
+            # Create a DataFrame with the correct feature names and the input data
+            input_data = pd.DataFrame({
+                'Origin_TargetEncoded': [origin_encoded],
+                'RoastLevel_TargetEncoded': [roast_level_encoded],
+                'Price': [price]
+            })
+
+            # Use the DataFrame for prediction
+            raw_prediction = get_model().predict(input_data)[0]
+            incr('predict.model')
+
+        # Adjust the prediction based on the price outliers
+        adjusted_prediction = adjust_prediction_for_price_outliers(raw_prediction, price)
 
     # Display the result using markdown
     if adjusted_prediction == 'High':
@@ -85,27 +112,15 @@ if st.button('Predict'):
 
     st.markdown(prediction_text)
 
-    # list of roast level chart
-    # coffee_products_df, customers_data_df, sales_data_df = load_data()
-    # final_df = preprocess_data(coffee_products_df, sales_data_df)
-    # # Generate roastlevel_analysis based on the selected roast level
-    # roastlevel_analysis = preprocess_for_roastlevel_analysis(final_df, roast_level_input)
-    # fig = create_roastlevel_analysis_chart(roastlevel_analysis)
-    # st.plotly_chart(fig)
-
-
-    # Top 10 roast level product
-    # roast10_df = preprocess_for_roast_top10(final_df, roast_level_input)
-    # fig1 = roast_top10(roast10_df)
-    # st.plotly_chart(fig1)
+    # list of roast level chart and top 10 roast level products (figure specs are cached per roast level)
+    # roastlevel_analysis_spec, roast_top10_spec = get_roast_level_chart_specs(roast_level_input)
+    # st.plotly_chart(roastlevel_analysis_spec)
+    # st.plotly_chart(roast_top10_spec)
 
 
 
     # #bubble chart
-    # coffee_products_df, customers_data_df, sales_data_df = load_data()
-    # final_df = preprocess_data(coffee_products_df, sales_data_df)
-    # fig2 = bubble_chart(final_df)
-    # st.plotly_chart(fig2)
+    # st.plotly_chart(get_bubble_chart_spec())
 
 
 
@@ -127,13 +142,8 @@ if st.button('Predict'):
 
     # Bubble chart section within an expander
     with st.expander("View Bubble Chart Analysis"):
-        # Load and preprocess the data
-        coffee_products_df, customers_data_df, sales_data_df = load_data()
-        final_df = preprocess_data(coffee_products_df, sales_data_df)
-        
-        # Generate the bubble chart
-        fig2 = bubble_chart(final_df)
-        st.plotly_chart(fig2)
+        # The chart is built once per data version from the Origin x RoastLevel aggregates and shared
+        st.plotly_chart(get_bubble_chart_spec())
 
         # Markdown explanation for the bubble chart
         st.markdown("""
@@ -142,7 +152,7 @@ if st.button('Predict'):
             The bubble chart visualizes sales data, making it easier to understand market dynamics at a glance. Here's how to read it:
 
             - **Axes**: The chart is divided by origin (horizontal axis) and roast level (vertical axis), organizing your coffee offerings.
-            - **Bubbles**: Each represents a coffee product, with its size indicating sales volume—larger bubbles denote higher sales.
+            - **Bubbles**: Each represents the coffee products of one origin and roast level, with its size indicating their combined sales volume—larger bubbles denote higher sales. Hover to see the number of products and the best seller.
 
             #### Insights:
             - **Sales Volume**: Larger bubbles highlight the best sellers. This signals strong consumer demand for these origins and roast levels.
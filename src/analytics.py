@@ -1,5 +1,7 @@
 import plotly.express as px
 
+from instrumentation import timed
+
 def create_roastlevel_analysis_chart(roastlevel_analysis):
     fig = px.bar(roastlevel_analysis, x='Origin', y='AvgMonthlySales',
                 title='Average Monthly Sales by Origin',
@@ -13,11 +15,14 @@ def create_roastlevel_analysis_chart(roastlevel_analysis):
     return fig
 
 
-# Create the bubble chart
-def bubble_chart(final_df):
-    fig = px.scatter(final_df, x="Origin", y="RoastLevel",
+# Create the bubble chart from the per-cell aggregates of preprocess_for_bubble_chart
+@timed('bubble_chart')
+def bubble_chart(bubble_df):
+    fig = px.scatter(bubble_df, x="Origin", y="RoastLevel",
                 size="AvgMonthlySales", color="AvgMonthlySales",
-                hover_name="ProductName",  # Showing product name on hover
+                hover_name="TopProduct",  # Showing the best-selling product on hover
+                hover_data={'Products': True},
+                labels={'AvgMonthlySales': 'Average Monthly Sales', 'TopProduct': 'Top Product'},
                 size_max=60,  # You can adjust the max bubble size
                 color_continuous_scale=px.colors.sequential.Viridis)
 
@@ -30,7 +35,8 @@ def bubble_chart(final_df):
 
 # Roast level top 10 products
 def roast_top10(roast10_df):
-    fig = px.bar(roast10_df, x='ProductName', y='AvgMonthlySales',
+    # Only the plotted columns go into the figure JSON
+    fig = px.bar(roast10_df[['ProductName', 'AvgMonthlySales']], x='ProductName', y='AvgMonthlySales',
                 title='Top 10 products by Roast Level',
                 labels={'AvgMonthlySales': 'Average Monthly Sales', 'ProductName': 'ProductName'},
                 color='AvgMonthlySales',
@@ -40,3 +46,18 @@ def roast_top10(roast10_df):
                 yaxis_title='Average Monthly Sales',
                 coloraxis_showscale=True)
     return fig
+
+
+# Predicted category across prices for one origin and roast level, from scoring.price_sweep; the class
+# probabilities are shown on hover
+def price_sweep_chart(sweep_df):
+    probability_columns = [column for column in sweep_df.columns if column.startswith('Probability_')]
+    fig = px.line(sweep_df, x='Price', y='AdjustedPrediction', line_shape='hv', markers=True,
+                title='Predicted Sales Performance by Price',
+                labels={'AdjustedPrediction': 'Prediction', 'Price': 'Price ($)'},
+                hover_data={column: ':.2f' for column in probability_columns},
+                category_orders={'AdjustedPrediction': ['Low', 'Medium', 'High']})
+
+    fig.update_layout(xaxis_title='Price ($)',
+                yaxis_title='Predicted Performance')
+    return fig
@@ -0,0 +1,226 @@
+import os
+
+import streamlit as st
+from joblib import load
+
+from analytics import bubble_chart, create_roastlevel_analysis_chart, price_sweep_chart, roast_top10
+from compact_model import COMPACT_MODEL_DIR, compact_model_is_current, load_compact_model
+from data_explorer import filter_mask, sort_indices, summary_statistics
+from data_processing import (DATA_DIR, DATA_FILES, RoastLevelIndex, build_final_df, data_signature, file_signature,
+                             load_data, preprocess_data, preprocess_for_bubble_chart, read_excel_table)
+from instrumentation import incr
+from prediction_table import TABLE_FILE, PredictionTable, build_prediction_table, price_grid
+from scoring import price_sweep
+
+MODELS_DIR = 'models'
+MODEL_FILE = 'your_model.joblib'
+ENCODING_FILES = ('origin_means.joblib', 'roastlevel_means.joblib')
+# Set to 1 to answer predictions from the precomputed table instead of the forest
+PREDICTION_TABLE_ENV = 'COFFEE_PREDICTION_TABLE'
+# Engine used to build final_df (see data_processing.ENGINES); defaults to pandas on the shared raw frames
+ENGINE_ENV = 'COFFEE_ENGINE'
+
+
+def model_signature(models_dir=MODELS_DIR):
+    return file_signature([os.path.join(models_dir, name) for name in (MODEL_FILE,) + ENCODING_FILES])
+
+
+# The loaders below use st.cache_resource, so one copy is shared by every page and session in the
+# process. Callers get the shared objects back and must treat them as read-only. The file signature
+# is part of the cache key and max_entries=1 drops the stale copy once the files change. Each cache
+# counts .misses in its loader and .lookups wherever it is called, including from other loaders.
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _load_raw_data(signature, data_dir):
+    incr('app_cache.raw_data.misses')
+    return load_data(data_dir)
+
+
+# Memory-mapped Arrow tables for the data explorer, plus the per-column sort orders and filter masks
+# it derives from them, so paging through a view never repeats the full-table work
+@st.cache_resource(max_entries=len(DATA_FILES), show_spinner=False)
+def _load_table(signature, path):
+    return read_excel_table(path)
+
+
+@st.cache_data(max_entries=len(DATA_FILES), show_spinner=False)
+def _summary_statistics(signature, path):
+    return summary_statistics(_load_table(signature, path))
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _sort_order(signature, path, column, ascending):
+    return sort_indices(_load_table(signature, path), column, ascending)
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _filter_mask(signature, path, column, text):
+    return filter_mask(_load_table(signature, path), column, text)
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _load_final_df(signature, data_dir):
+    incr('app_cache.final_df.misses')
+    engine = os.environ.get(ENGINE_ENV, 'pandas')
+    if engine != 'pandas':
+        return build_final_df(engine, data_dir)
+    incr('app_cache.raw_data.lookups')
+    coffee_products_df, _, sales_data_df = _load_raw_data(signature, data_dir)
+    # preprocess_data adds columns to its inputs; shallow copies keep the shared frames untouched
+    return preprocess_data(coffee_products_df.copy(deep=False), sales_data_df.copy(deep=False))
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _load_roast_index(signature, data_dir):
+    incr('app_cache.roast_index.misses')
+    incr('app_cache.final_df.lookups')
+    return RoastLevelIndex(_load_final_df(signature, data_dir))
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _load_model(signature, models_dir):
+    incr('app_cache.model.misses')
+    model_path = os.path.join(models_dir, MODEL_FILE)
+    compact_path = os.path.join(models_dir, COMPACT_MODEL_DIR)
+    # The compact export loads memory-mapped without importing sklearn; the pickle is the fallback
+    if compact_model_is_current(compact_path, model_path):
+        return load_compact_model(compact_path)
+    return load(model_path)
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _load_encodings(signature, models_dir):
+    incr('app_cache.encodings.misses')
+    origin_means, roastlevel_means = (load(os.path.join(models_dir, name)) for name in ENCODING_FILES)
+    return origin_means, roastlevel_means
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _load_prediction_table(signature, models_dir):
+    incr('app_cache.prediction_table.misses')
+    path = os.path.join(models_dir, TABLE_FILE)
+    # A table older than the model or encodings was built from a previous model, so it is rebuilt
+    if os.path.exists(path) and os.stat(path).st_mtime_ns >= max(mtime_ns for _, mtime_ns, _ in signature):
+        return PredictionTable.load(path)
+    origin_means, roastlevel_means = get_encodings(models_dir)
+    table = build_prediction_table(get_model(models_dir), origin_means, roastlevel_means)
+    table.save(path)
+    return table
+
+
+# Built charts are cached as figure specs (plain dicts, which st.plotly_chart accepts), so a rerun or
+# another session reuses them instead of aggregating and rebuilding the figure
+@st.cache_data(max_entries=1, show_spinner=False)
+def _bubble_chart_spec(signature, data_dir):
+    incr('app_cache.bubble_chart_spec.misses')
+    incr('app_cache.final_df.lookups')
+    final_df = _load_final_df(signature, data_dir)
+    return bubble_chart(preprocess_for_bubble_chart(final_df)).to_dict()
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _roast_level_chart_specs(signature, data_dir, roast_level):
+    incr('app_cache.roast_level_chart_specs.misses')
+    incr('app_cache.roast_index.lookups')
+    roast_index = _load_roast_index(signature, data_dir)
+    analysis_spec = create_roastlevel_analysis_chart(roast_index.roastlevel_analysis(roast_level)).to_dict()
+    top10_spec = roast_top10(roast_index.top_products(roast_level)).to_dict()
+    return analysis_spec, top10_spec
+
+
+# The what-if price curve for one origin and roast level over the slider's grid. In prediction-table mode
+# it is a row of the table, so the forest is not loaded; otherwise it is one batched prediction.
+@st.cache_data(max_entries=64, show_spinner=False)
+def _price_sweep_spec(signature, models_dir, origin, roast_level, use_table):
+    incr('app_cache.price_sweep_spec.misses')
+    sweep_df = get_prediction_table(models_dir).sweep(origin, roast_level) if use_table else None
+    if sweep_df is None:
+        origin_means, roastlevel_means = get_encodings(models_dir)
+        sweep_df = price_sweep(get_model(models_dir), origin, roast_level, price_grid(), origin_means, roastlevel_means)
+    return price_sweep_chart(sweep_df).to_dict()
+
+
+def prediction_table_enabled():
+    return os.environ.get(PREDICTION_TABLE_ENV, '') not in ('', '0')
+
+
+def get_table(name, data_dir=DATA_DIR):
+    path = os.path.join(data_dir, name)
+    return _load_table(file_signature([path]), path)
+
+
+def get_summary_statistics(name, data_dir=DATA_DIR):
+    path = os.path.join(data_dir, name)
+    return _summary_statistics(file_signature([path]), path)
+
+
+def get_sort_order(name, column, ascending=True, data_dir=DATA_DIR):
+    path = os.path.join(data_dir, name)
+    return _sort_order(file_signature([path]), path, column, ascending)
+
+
+def get_filter_mask(name, column, text, data_dir=DATA_DIR):
+    path = os.path.join(data_dir, name)
+    return _filter_mask(file_signature([path]), path, column, text)
+
+
+def get_raw_data(data_dir=DATA_DIR):
+    incr('app_cache.raw_data.lookups')
+    return _load_raw_data(data_signature(data_dir), data_dir)
+
+
+def get_final_df(data_dir=DATA_DIR):
+    incr('app_cache.final_df.lookups')
+    return _load_final_df(data_signature(data_dir), data_dir)
+
+
+def get_roast_index(data_dir=DATA_DIR):
+    incr('app_cache.roast_index.lookups')
+    return _load_roast_index(data_signature(data_dir), data_dir)
+
+
+def get_bubble_chart_spec(data_dir=DATA_DIR):
+    incr('app_cache.bubble_chart_spec.lookups')
+    return _bubble_chart_spec(data_signature(data_dir), data_dir)
+
+
+def get_roast_level_chart_specs(roast_level, data_dir=DATA_DIR):
+    incr('app_cache.roast_level_chart_specs.lookups')
+    return _roast_level_chart_specs(data_signature(data_dir), data_dir, roast_level)
+
+
+def get_model(models_dir=MODELS_DIR):
+    incr('app_cache.model.lookups')
+    return _load_model(model_signature(models_dir), models_dir)
+
+
+def get_encodings(models_dir=MODELS_DIR):
+    incr('app_cache.encodings.lookups')
+    return _load_encodings(model_signature(models_dir), models_dir)
+
+
+def get_price_sweep_spec(origin, roast_level, models_dir=MODELS_DIR):
+    incr('app_cache.price_sweep_spec.lookups')
+    return _price_sweep_spec(model_signature(models_dir), models_dir, origin, roast_level, prediction_table_enabled())
+
+
+def get_prediction_table(models_dir=MODELS_DIR):
+    if not prediction_table_enabled():
+        return None
+    incr('app_cache.prediction_table.lookups')
+    return _load_prediction_table(model_signature(models_dir), models_dir)
+
+
+def clear_caches():
+    _load_table.clear()
+    _summary_statistics.clear()
+    _sort_order.clear()
+    _filter_mask.clear()
+    _load_raw_data.clear()
+    _load_final_df.clear()
+    _load_roast_index.clear()
+    _bubble_chart_spec.clear()
+    _roast_level_chart_specs.clear()
+    _load_model.clear()
+    _load_encodings.clear()
+    _load_prediction_table.clear()
+    _price_sweep_spec.clear()
@@ -0,0 +1,44 @@
+import argparse
+import time
+
+import pandas as pd
+
+from data_processing import preprocess_data, preprocess_data_fast
+from synthetic_data import generate_data
+
+
+def time_call(func, coffee_products_df, sales_data_df, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        # Both paths add columns to their inputs, so every run gets fresh shallow copies
+        products, sales = coffee_products_df.copy(deep=False), sales_data_df.copy(deep=False)
+        start = time.perf_counter()
+        result = func(products, sales)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare preprocess_data with the vectorised preprocess_data_fast.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000_000, 10_000_000, 50_000_000],
+                        help='Numbers of synthetic sale rows to benchmark.')
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--fast-only', action='store_true',
+                        help='Skip the merge-based path, e.g. when it does not fit in memory.')
+    args = parser.parse_args()
+
+    print(f"{'rows':>12} {'preprocess_data':>16} {'fast':>10} {'speedup':>8}")
+    for n_sales in args.sizes:
+        coffee_products_df, _, sales_data_df = generate_data(n_products=args.products, n_sales=n_sales, seed=n_sales)
+        fast_time, fast_df = time_call(preprocess_data_fast, coffee_products_df, sales_data_df, args.repeat)
+        if args.fast_only:
+            print(f'{n_sales:>12,} {"-":>16} {fast_time:>9.3f}s {"-":>8}')
+            continue
+        base_time, base_df = time_call(preprocess_data, coffee_products_df, sales_data_df, args.repeat)
+        pd.testing.assert_frame_equal(fast_df, base_df, check_exact=True)
+        print(f'{n_sales:>12,} {base_time:>15.3f}s {fast_time:>9.3f}s {base_time / fast_time:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
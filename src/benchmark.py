@@ -0,0 +1,230 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+from data_processing import (load_data, preprocess_data, preprocess_data_fast, preprocess_for_roast_top10,
+                             preprocess_for_roastlevel_analysis)
+from model_training import FEATURES, build_training_data, run_search
+from prediction_table import build_prediction_table
+from scoring import score_candidates
+from synthetic_data import ROAST_LEVELS, generate_data, write_excel
+
+DEFAULT_THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_thresholds.json')
+
+
+# Resident set size of this process in bytes, or None where /proc is not available
+def _rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# Samples the process RSS in a background thread while the block runs; peak is the growth over the RSS
+# at the start, in bytes (None where RSS can't be read)
+class RssSampler:
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.peak = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._max = max(self._max, _rss())
+
+    def __enter__(self):
+        self._start = _rss()
+        if self._start is not None:
+            self._max = self._start
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._start is not None:
+            self._stop.set()
+            self._thread.join()
+            self.peak = max(self._max, _rss()) - self._start
+
+
+# Runs func once for the peak memory, then `repeat` more times for the best wall time. setup builds fresh
+# arguments for every run, since several stages add columns to their inputs. peak_mb is from tracemalloc
+# and only counts Python allocations (numpy and pandas buffers included); memory that Arrow, the Excel
+# reader or sklearn's compiled code allocate directly is invisible to it. peak_rss_mb is the growth of
+# the whole process's resident memory during the run, which does include them (Linux only, else None).
+def measure(func, setup, repeat):
+    args = setup()
+    tracemalloc.start()
+    with RssSampler() as rss:
+        func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    times = []
+    for _ in range(repeat):
+        args = setup()
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return {'seconds': min(times), 'median_seconds': float(np.median(times)), 'peak_mb': peak / 2 ** 20,
+            'peak_rss_mb': rss.peak / 2 ** 20 if rss.peak is not None else None}
+
+
+def run_benchmarks(n_products, n_customers, n_sales, n_candidates, repeat, search, seed=0):
+    coffee_products_df, customers_data_df, sales_data_df = generate_data(n_products, n_customers, n_sales, seed)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        write_excel(data_dir, coffee_products_df, customers_data_df, sales_data_df)
+        results['load_data'] = measure(lambda: load_data(data_dir, use_cache=False), tuple, repeat)
+        load_data(data_dir)
+        results['load_data_cached'] = measure(lambda: load_data(data_dir), tuple, repeat)
+
+    def frames():
+        return coffee_products_df.copy(deep=False), sales_data_df.copy(deep=False)
+
+    results['preprocess_data'] = measure(preprocess_data, frames, repeat)
+    results['preprocess_data_fast'] = measure(preprocess_data_fast, frames, repeat)
+
+    final_df = preprocess_data(*frames())
+    results['preprocess_for_roastlevel_analysis'] = measure(
+        lambda: [preprocess_for_roastlevel_analysis(final_df, roast_level) for roast_level in ROAST_LEVELS], tuple, repeat)
+    results['preprocess_for_roast_top10'] = measure(
+        lambda: [preprocess_for_roast_top10(final_df, roast_level) for roast_level in ROAST_LEVELS], tuple, repeat)
+
+    final_df, origin_means, roastlevel_means, _ = build_training_data(final_df)
+    X_train, _, y_train, _ = train_test_split(final_df[FEATURES], final_df['PerformanceCategory'], random_state=42)
+    # Training is slow, so it is timed once rather than `repeat` times
+    models = []
+    results['train'] = measure(lambda: models.append(run_search(X_train, y_train, search)[0]), tuple, 1)
+    model = models[-1]
+
+    rng = np.random.default_rng(seed)
+    candidates_df = pd.DataFrame({
+        'Origin': rng.choice(list(origin_means), n_candidates),
+        'RoastLevel': rng.choice(list(roastlevel_means), n_candidates),
+        'Price': rng.integers(10, 121, n_candidates) / 2,
+    })
+    results['predict_single'] = measure(
+        lambda: score_candidates(candidates_df.head(1), model, origin_means, roastlevel_means), tuple, repeat)
+    results['predict_batch'] = measure(
+        lambda: score_candidates(candidates_df, model, origin_means, roastlevel_means), tuple, repeat)
+
+    tables = []
+    results['build_prediction_table'] = measure(
+        lambda: tables.append(build_prediction_table(model, origin_means, roastlevel_means)), tuple, repeat)
+    # The table must answer on-grid candidates exactly as the model does
+    table, scored_df = tables[-1], score_candidates(candidates_df, model, origin_means, roastlevel_means)
+    for row in scored_df.head(100).itertuples():
+        assert table.lookup(row.Origin, row.RoastLevel, row.Price)[0] == row.Prediction
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Thresholds file: {"stage": {"max_seconds": ..., "max_peak_mb": ..., "max_peak_rss_mb": ...,
+# "max_regression": ...}}, where max_regression is the allowed ratio to the same stage in the baseline
+# results and is only checked when a baseline is given. The shipped limits are for the default config.
+def check_thresholds(stages, thresholds, baseline_stages=None):
+    failures = []
+    for stage, limits in thresholds.items():
+        if stage not in stages:
+            failures.append(f'{stage}: no result')
+            continue
+        result = stages[stage]
+        if 'max_seconds' in limits and result['seconds'] > limits['max_seconds']:
+            failures.append(f"{stage}: {result['seconds']:.4f}s > {limits['max_seconds']}s")
+        if 'max_peak_mb' in limits and result['peak_mb'] > limits['max_peak_mb']:
+            failures.append(f"{stage}: {result['peak_mb']:.1f} MB > {limits['max_peak_mb']} MB")
+        if 'max_peak_rss_mb' in limits and (result.get('peak_rss_mb') or 0) > limits['max_peak_rss_mb']:
+            failures.append(f"{stage}: {result['peak_rss_mb']:.1f} MB RSS > {limits['max_peak_rss_mb']} MB")
+        if 'max_regression' in limits and baseline_stages and stage in baseline_stages:
+            ratio = result['seconds'] / baseline_stages[stage]['seconds']
+            if ratio > limits['max_regression']:
+                failures.append(f"{stage}: {ratio:.2f}x slower than baseline > {limits['max_regression']}x")
+    return failures
+
+
+def print_results(stages, baseline_stages=None):
+    print(f"{'stage':<36} {'seconds':>10} {'peak MB':>9} {'RSS MB':>9} {'vs baseline':>12}")
+    for stage, result in stages.items():
+        ratio = ''
+        if baseline_stages and stage in baseline_stages:
+            ratio = f"{result['seconds'] / baseline_stages[stage]['seconds']:.2f}x"
+        rss = f"{result['peak_rss_mb']:.1f}" if result.get('peak_rss_mb') is not None else '-'
+        print(f"{stage:<36} {result['seconds']:>10.4f} {result['peak_mb']:>9.1f} {rss:>9} {ratio:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark load -> preprocess -> train -> predict on synthetic data.')
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--customers', type=int, default=2000)
+    parser.add_argument('--sales', type=int, default=50_000)
+    parser.add_argument('--candidates', type=int, default=10_000, help='Rows in the batch prediction stage.')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--search', choices=['grid', 'halving', 'random'], default='grid')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results to this JSON file.')
+    parser.add_argument('--baseline', help='Results JSON from an earlier run to compare against.')
+    parser.add_argument('--thresholds', default=DEFAULT_THRESHOLDS,
+                        help='JSON file of per-stage limits; the run fails if one is exceeded.')
+    args = parser.parse_args()
+
+    config = {'products': args.products, 'customers': args.customers, 'sales': args.sales,
+              'candidates': args.candidates, 'repeat': args.repeat, 'search': args.search, 'seed': args.seed}
+    stages = run_benchmarks(args.products, args.customers, args.sales, args.candidates, args.repeat, args.search,
+                            args.seed)
+    results = {
+        'commit': _git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': config,
+        'stages': stages,
+    }
+
+    baseline_stages = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['config'] != config:
+            print(f"Warning: baseline was run with a different config: {baseline['config']}")
+        baseline_stages = baseline['stages']
+    print_results(stages, baseline_stages)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.thresholds:
+        with open(args.thresholds) as f:
+            thresholds = json.load(f)
+        if baseline_stages is None and any('max_regression' in limits for limits in thresholds.values()):
+            print('No --baseline given, so only the absolute limits are checked')
+        failures = check_thresholds(stages, thresholds, baseline_stages)
+        if failures:
+            print('Benchmark thresholds exceeded:')
+            for failure in failures:
+                print(f'  {failure}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
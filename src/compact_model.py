@@ -0,0 +1,177 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from data_processing import file_sha256
+
+COMPACT_MODEL_DIR = 'compact_model'
+FORMAT_NAME = 'coffee-compact-forest'
+FORMAT_VERSION = 1
+FEATURES = ['Origin_TargetEncoded', 'RoastLevel_TargetEncoded', 'Price']
+ARRAYS = ('scaler_mean', 'scaler_scale', 'tree_roots', 'feature', 'threshold', 'children_left', 'children_right', 'values')
+
+
+# StandardScaler + RandomForestClassifier flattened into plain arrays: every tree's nodes are stored
+# back to back, with child indices pointing into the shared node arrays (-1 for leaves) and the
+# normalised class distribution of every node. Each array is a .npy file next to a JSON manifest, so it
+# loads memory-mapped without unpickling anything or importing sklearn.
+class CompactForest:
+    def __init__(self, manifest, arrays):
+        self.manifest = manifest
+        self.classes_ = np.asarray(manifest['classes'], dtype=object)
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+
+    def _feature_matrix(self, X):
+        if hasattr(X, 'columns'):
+            X = X[FEATURES]
+        return np.asarray(X, dtype=np.float64)
+
+    # Same arithmetic as the sklearn pipeline: scale in float64, then compare the float32 features with
+    # the float64 thresholds, and average the per-tree distributions in tree order. Each tree is walked
+    # level by level for all samples at once, dropping samples as they reach a leaf.
+    def predict_proba(self, X):
+        X = (self._feature_matrix(X) - self.scaler_mean) / self.scaler_scale
+        X = X.astype(np.float32).T
+        n_samples = X.shape[1]
+
+        probabilities = np.zeros((n_samples, len(self.classes_)))
+        for root in self.tree_roots:
+            nodes = np.full(n_samples, root, dtype=np.int32)
+            active = np.arange(n_samples)
+            while active.size:
+                current = nodes[active]
+                left = self.children_left.take(current)
+                internal = left >= 0
+                active, current, left = active[internal], current[internal], left[internal]
+                go_left = X[self.feature.take(current), active] <= self.threshold.take(current)
+                nodes[active] = np.where(go_left, left, self.children_right.take(current))
+            probabilities += self.values[nodes]
+        return probabilities / len(self.tree_roots)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def _flatten_forest(forest):
+    feature, threshold, children_left, children_right, values, roots = [], [], [], [], [], []
+    offset = 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left < 0
+        roots.append(offset)
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        children_left.append(np.where(is_leaf, -1, tree.children_left + offset))
+        children_right.append(np.where(is_leaf, -1, tree.children_right + offset))
+        value = tree.value[:, 0, :]
+        normalizer = value.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0.0] = 1.0
+        values.append(value / normalizer)
+        offset += tree.node_count
+    return {
+        'tree_roots': np.array(roots, dtype=np.int32),
+        'feature': np.concatenate(feature).astype(np.int32),
+        'threshold': np.concatenate(threshold).astype(np.float64),
+        'children_left': np.concatenate(children_left).astype(np.int32),
+        'children_right': np.concatenate(children_right).astype(np.int32),
+        'values': np.concatenate(values).astype(np.float64),
+    }
+
+
+def export_compact_model(pipeline, origin_means, roastlevel_means, path, source_path=None):
+    scaler = pipeline.named_steps['standardscaler']
+    forest = pipeline.named_steps['randomforestclassifier']
+    arrays = _flatten_forest(forest)
+    arrays['scaler_mean'] = np.asarray(scaler.mean_, dtype=np.float64)
+    arrays['scaler_scale'] = np.asarray(scaler.scale_, dtype=np.float64)
+
+    manifest = {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'features': FEATURES,
+        'classes': [str(label) for label in forest.classes_],
+        'max_depth': int(max(estimator.tree_.max_depth for estimator in forest.estimators_)),
+        'n_trees': len(forest.estimators_),
+        'origin_means': {str(key): float(value) for key, value in origin_means.items()},
+        'roastlevel_means': {str(key): float(value) for key, value in roastlevel_means.items()},
+        # Lets the app tell whether the export still matches the pickled model next to it
+        'source_sha256': file_sha256(source_path) if source_path is not None else None,
+    }
+
+    # Written to a uniquely named sibling directory and swapped in, so readers never see a half-written
+    # model and concurrent exports never write into the same directory
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        for name in ARRAYS:
+            np.save(os.path.join(tmp_path, name + '.npy'), arrays[name])
+        with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        _swap_in_directory(tmp_path, path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+
+# A directory can't be renamed over a non-empty one, so the current export is first moved into a fresh
+# temporary directory and deleted; if another export lands in between, it is moved aside the same way
+def _swap_in_directory(tmp_path, path):
+    while True:
+        try:
+            os.replace(tmp_path, path)
+            return
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+        old_path = tempfile.mkdtemp(dir=os.path.dirname(tmp_path), suffix='.old')
+        try:
+            os.rename(path, os.path.join(old_path, 'model'))
+        except FileNotFoundError:
+            pass
+        shutil.rmtree(old_path, ignore_errors=True)
+
+
+def load_compact_model(path, mmap_mode='r'):
+    with open(os.path.join(path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT_NAME or manifest.get('version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported compact model format in {path}: {manifest.get('format')} v{manifest.get('version')}")
+    arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode) for name in ARRAYS}
+    return CompactForest(manifest, arrays)
+
+
+# The export is usable when there is no pickled model to compare against, or when it was made from
+# exactly the pickled model that is there now
+def compact_model_is_current(path, source_path):
+    manifest_path = os.path.join(path, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return False
+    if not os.path.exists(source_path):
+        return True
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    return manifest.get('source_sha256') == file_sha256(source_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the trained model to the compact array format.')
+    parser.add_argument('--models-dir', default='models')
+    args = parser.parse_args()
+
+    from joblib import load
+    source_path = os.path.join(args.models_dir, 'your_model.joblib')
+    origin_means = load(os.path.join(args.models_dir, 'origin_means.joblib'))
+    roastlevel_means = load(os.path.join(args.models_dir, 'roastlevel_means.joblib'))
+    path = os.path.join(args.models_dir, COMPACT_MODEL_DIR)
+    export_compact_model(load(source_path), origin_means, roastlevel_means, path, source_path)
+    print(f'Exported {source_path} to {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Server-side querying over the memory-mapped Arrow tables from read_excel_table. Filtering and sorting
+# produce row positions; only the requested page of rows is ever converted to pandas and sent out.
+
+
+# Categorical columns come back from the cache dictionary-encoded; they are queried as plain strings
+def _decoded(column):
+    if pa.types.is_dictionary(column.type):
+        return column.cast(column.type.value_type)
+    return column
+
+
+def summary_statistics(table):
+    rows = []
+    for name, column in zip(table.column_names, table.columns):
+        column = _decoded(column)
+        row = {'Column': name, 'Type': str(column.type), 'Rows': len(column), 'Nulls': column.null_count,
+               'Distinct': None, 'Min': None, 'Max': None, 'Mean': None}
+        if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+            row['Distinct'] = pc.count_distinct(column).as_py()
+        elif pa.types.is_integer(column.type) or pa.types.is_floating(column.type) or pa.types.is_temporal(column.type):
+            min_max = pc.min_max(column)
+            row['Min'], row['Max'] = str(min_max['min'].as_py()), str(min_max['max'].as_py())
+            if not pa.types.is_temporal(column.type):
+                row['Mean'] = pc.mean(column).as_py()
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def sort_indices(table, column, ascending=True):
+    order = 'ascending' if ascending else 'descending'
+    values = pa.table({column: _decoded(table.column(column))})
+    return pc.sort_indices(values, sort_keys=[(column, order)]).to_numpy()
+
+
+# Case-insensitive substring match for text columns, equality for numbers
+def filter_mask(table, column, text):
+    values = _decoded(table.column(column))
+    if pa.types.is_string(values.type) or pa.types.is_large_string(values.type):
+        mask = pc.match_substring(values, text, ignore_case=True)
+    elif pa.types.is_integer(values.type) or pa.types.is_floating(values.type):
+        try:
+            number = float(text)
+        except ValueError:
+            return np.zeros(len(values), dtype=bool)
+        mask = pc.equal(values, number)
+    else:
+        mask = pc.match_substring(pc.cast(values, pa.string()), text, ignore_case=True)
+    return pc.fill_null(mask, False).to_numpy(zero_copy_only=False)
+
+
+# Row positions to show, in display order: the sort order (or the table order) restricted to the filter
+def select_rows(n_rows, order=None, mask=None):
+    if order is None:
+        return np.flatnonzero(mask) if mask is not None else None
+    return order[mask[order]] if mask is not None else order
+
+
+def page_rows(table, rows, page, page_size, columns=None):
+    n_matching = table.num_rows if rows is None else len(rows)
+    start = page * page_size
+    stop = min(start + page_size, n_matching)
+    if columns:
+        table = table.select(columns)
+
+    if rows is None:
+        page_df = table.slice(start, max(stop - start, 0)).to_pandas()
+        page_df.index = pd.RangeIndex(start, start + len(page_df))
+    else:
+        positions = rows[start:stop]
+        page_df = table.take(pa.array(positions, type=pa.int64())).to_pandas()
+        page_df.index = positions
+    return page_df, n_matching
@@ -1,36 +1,264 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
 import pandas as pd
+import pyarrow.feather as feather
 
-def load_data():
-    coffee_products_df = pd.read_excel('data/Coffee_Products.xlsx', engine='openpyxl')
-    customers_data_df = pd.read_excel('data/Customers_Data.xlsx', engine='openpyxl')
-    sales_data_df = pd.read_excel('data/Sales_Data.xlsx', engine='openpyxl')
-    return coffee_products_df, customers_data_df, sales_data_df
+from instrumentation import incr, span, timed
+from schema import CUSTOMERS_SCHEMA, PRODUCTS_SCHEMA, SALES_SCHEMA, SCHEMA_VERSION, enforce_schema
 
-def preprocess_data(coffee_products_df, sales_data_df):
-    total_sales_per_product = sales_data_df.groupby('ProductID')['Quantity'].sum()
+DATA_DIR = 'data'
+DATA_FILES = ('Coffee_Products.xlsx', 'Customers_Data.xlsx', 'Sales_Data.xlsx')
+SCHEMAS = dict(zip(DATA_FILES, (PRODUCTS_SCHEMA, CUSTOMERS_SCHEMA, SALES_SCHEMA)))
+
+
+# Cache key for a set of files; it changes whenever one of them is replaced or modified
+def file_signature(paths):
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def data_signature(data_dir=DATA_DIR):
+    return file_signature([os.path.join(data_dir, name) for name in DATA_FILES])
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# write(tmp_path) writes the file under a unique temporary name next to path, which then replaces path in
+# one step, so readers never see a partial file and concurrent writers never share a temporary file
+def _write_atomic(path, write):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.',
+                                    suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _write_json_atomic(obj, path):
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(obj, f)
+    _write_atomic(path, write)
+
+
+# Parses an Excel sheet and, for the three datasets, validates it and converts it to its schema
+def read_excel(path):
+    df = pd.read_excel(path, engine='openpyxl')
+    name = os.path.basename(path)
+    if name in SCHEMAS:
+        df = enforce_schema(df, SCHEMAS[name], name)
+    return df
+
+
+# Columnar (Feather) copy of an Excel sheet, keyed by the source file's mtime, size and hash.
+# An unchanged source is memory-mapped from the cache; the Excel file is only re-parsed when it changes.
+def read_excel_table(path, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(path), 'cache')
+    name = os.path.splitext(os.path.basename(path))[0]
+    cache_path = os.path.join(cache_dir, name + '.feather')
+    meta_path = os.path.join(cache_dir, name + '.json')
+
+    incr('excel_cache.lookups')
+    stat = os.stat(path)
+    meta = None
+    if os.path.exists(cache_path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('schema_version') != SCHEMA_VERSION:
+            meta = None
+
+    if meta is not None and (meta['mtime_ns'], meta['size']) != (stat.st_mtime_ns, stat.st_size):
+        sha256 = file_sha256(path)
+        if meta['sha256'] == sha256:
+            # Touched but not modified, so the cached copy is still valid
+            meta.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+            _write_json_atomic(meta, meta_path)
+        else:
+            meta = None
+
+    if meta is None:
+        incr('excel_cache.misses')
+        with span('read_excel'):
+            df = read_excel(path)
+        os.makedirs(cache_dir, exist_ok=True)
+        _write_atomic(cache_path, lambda tmp_path: feather.write_feather(df, tmp_path, compression='uncompressed'))
+        _write_json_atomic({'source': os.path.basename(path), 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+                            'sha256': file_sha256(path), 'schema_version': SCHEMA_VERSION}, meta_path)
+
+    return feather.read_table(cache_path, memory_map=True)
+
+
+def read_excel_cached(path, cache_dir=None):
+    return read_excel_table(path, cache_dir).to_pandas()
+
+
+@timed('load_data')
+def load_data(data_dir=DATA_DIR, use_cache=True):
+    paths = [os.path.join(data_dir, name) for name in DATA_FILES]
+    if use_cache:
+        return tuple(read_excel_cached(path) for path in paths)
+    return tuple(read_excel(path) for path in paths)
+
+def add_months_on_market(coffee_products_df):
     coffee_products_df['LaunchDate'] = pd.to_datetime(coffee_products_df['LaunchDate'])
     end_date = pd.Timestamp('2023-12-31')
     coffee_products_df['MonthsOnMarket'] = ((end_date.year - coffee_products_df['LaunchDate'].dt.year) * 12 + end_date.month - coffee_products_df['LaunchDate'].dt.month)
-    average_monthly_sales = pd.merge(total_sales_per_product.reset_index(), coffee_products_df[['ProductID', 'MonthsOnMarket']], on='ProductID')
+    return coffee_products_df
+
+
+# Builds final_df from the two per-product sales aggregates (indexed by ProductID), so every way of
+# computing them produces the same final_df contract
+def assemble_final_df(total_sales_per_product, product_sales_share, coffee_products_df):
+    add_months_on_market(coffee_products_df)
+    average_monthly_sales = pd.merge(total_sales_per_product.rename('Quantity').reset_index(), coffee_products_df[['ProductID', 'MonthsOnMarket']], on='ProductID')
     average_monthly_sales['AvgMonthlySales'] = average_monthly_sales['Quantity'] / average_monthly_sales['MonthsOnMarket']
-    
-    sales_data_df['YearMonth'] = sales_data_df['SaleDate'].dt.to_period('M')
-    monthly_total_sales = sales_data_df.groupby('YearMonth')['Quantity'].sum().reset_index(name='TotalMonthlySales')
-    sales_data_with_monthly_totals = pd.merge(sales_data_df, monthly_total_sales, on='YearMonth')
-    sales_data_with_monthly_totals['SalesShare'] = sales_data_with_monthly_totals['Quantity'] / sales_data_with_monthly_totals['TotalMonthlySales']
-    product_sales_share = sales_data_with_monthly_totals.groupby('ProductID')['SalesShare'].mean().reset_index()
-    average_monthly_sales_with_share = pd.merge(average_monthly_sales, product_sales_share, on='ProductID')
+
+    average_monthly_sales_with_share = pd.merge(average_monthly_sales, product_sales_share.rename('SalesShare').reset_index(), on='ProductID')
     average_monthly_sales_with_share['CompositeMetric'] = average_monthly_sales_with_share['AvgMonthlySales'] * average_monthly_sales_with_share['SalesShare']
     # Merging the processed data back with coffee_products_df
     final_df = pd.merge(average_monthly_sales_with_share, coffee_products_df, on='ProductID', how='left')
-    
+
     return final_df
 
 
+@timed('preprocess_data')
+def preprocess_data(coffee_products_df, sales_data_df):
+    incr('rows.preprocess_data', len(sales_data_df))
+    total_sales_per_product = sales_data_df.groupby('ProductID')['Quantity'].sum()
+    if total_sales_per_product.dtype.kind == 'i':
+        # pandas hands small integer sums back in the column's downcast dtype; totals are always int64
+        total_sales_per_product = total_sales_per_product.astype('int64')
+
+    sales_data_df['YearMonth'] = sales_data_df['SaleDate'].dt.to_period('M')
+    monthly_total_sales = sales_data_df.groupby('YearMonth')['Quantity'].sum().reset_index(name='TotalMonthlySales')
+    sales_data_with_monthly_totals = pd.merge(sales_data_df, monthly_total_sales, on='YearMonth')
+    sales_data_with_monthly_totals['SalesShare'] = sales_data_with_monthly_totals['Quantity'] / sales_data_with_monthly_totals['TotalMonthlySales']
+    product_sales_share = sales_data_with_monthly_totals.groupby('ProductID')['SalesShare'].mean()
+
+    return assemble_final_df(total_sales_per_product, product_sales_share, coffee_products_df)
+
+
+def _group_sum(values, codes, n_groups):
+    if np.issubdtype(values.dtype, np.integer):
+        # Integer sums are exact through bincount
+        return np.bincount(codes, weights=values, minlength=n_groups).astype(np.int64)
+    return pd.Series(values).groupby(codes).sum().reindex(range(n_groups), fill_value=0).to_numpy()
+
+
+# Calendar conversion is slow per row, so convert only the distinct sale days to months
+def _month_codes(sale_dates):
+    day_codes, days = pd.factorize(sale_dates.astype('datetime64[D]'))
+    day_month_codes, months = pd.factorize(days.astype('datetime64[M]'))
+    month_codes = np.where(day_codes >= 0, day_month_codes[day_codes], -1)
+    return month_codes, len(months)
+
+
+# Same per-product aggregates as preprocess_data, computed on integer-coded ProductID and month arrays
+# instead of merging the monthly totals back onto every sale row
+def sales_aggregates_fast(sales_data_df):
+    product_codes, product_ids = pd.factorize(sales_data_df['ProductID'], sort=True)
+    month_codes, n_months = _month_codes(sales_data_df['SaleDate'].to_numpy())
+    quantity = sales_data_df['Quantity'].to_numpy()
+
+    total_sales_per_product = pd.Series(_group_sum(quantity, product_codes, len(product_ids)),
+                                        index=pd.Index(product_ids, name='ProductID'))
+
+    # Sales without a date have no month, so (as with the merge) they don't count towards SalesShare
+    dated = month_codes >= 0
+    if not dated.all():
+        product_codes, month_codes, quantity = product_codes[dated], month_codes[dated], quantity[dated]
+    monthly_total_sales = _group_sum(quantity, month_codes, n_months)
+    sales_share = quantity / monthly_total_sales[month_codes]
+    # pandas' grouped mean keeps the exact summation preprocess_data uses, so the result is bit-identical
+    product_sales_share = pd.Series(sales_share).groupby(product_codes).mean()
+    product_sales_share.index = pd.Index(product_ids[product_sales_share.index], name='ProductID')
+
+    return total_sales_per_product, product_sales_share
+
+
+# Join-free equivalent of assemble_final_df: products are looked up by position in the catalogue
+def _assemble_final_df_fast(total_sales_per_product, product_sales_share, coffee_products_df):
+    overlapping = {'Quantity', 'AvgMonthlySales', 'SalesShare', 'CompositeMetric'} & set(coffee_products_df.columns)
+    if not coffee_products_df['ProductID'].is_unique or overlapping:
+        return assemble_final_df(total_sales_per_product, product_sales_share, coffee_products_df)
+
+    add_months_on_market(coffee_products_df)
+    share_positions = product_sales_share.index.get_indexer(total_sales_per_product.index)
+    catalogue_positions = pd.Index(coffee_products_df['ProductID']).get_indexer(total_sales_per_product.index)
+    keep = (share_positions >= 0) & (catalogue_positions >= 0)
+    catalogue_positions = catalogue_positions[keep]
+
+    products = coffee_products_df.take(catalogue_positions).reset_index(drop=True)
+    months_on_market = products['MonthsOnMarket']
+    final_df = pd.DataFrame({
+        'ProductID': total_sales_per_product.index[keep].to_numpy(),
+        'Quantity': total_sales_per_product.to_numpy()[keep],
+        'MonthsOnMarket_x': months_on_market,
+    })
+    final_df['AvgMonthlySales'] = final_df['Quantity'] / final_df['MonthsOnMarket_x']
+    final_df['SalesShare'] = product_sales_share.to_numpy()[share_positions[keep]]
+    final_df['CompositeMetric'] = final_df['AvgMonthlySales'] * final_df['SalesShare']
+    products = products.drop(columns='ProductID').rename(columns={'MonthsOnMarket': 'MonthsOnMarket_y'})
+
+    return pd.concat([final_df, products], axis=1)
+
+
+@timed('preprocess_data_fast')
+def preprocess_data_fast(coffee_products_df, sales_data_df):
+    incr('rows.preprocess_data_fast', len(sales_data_df))
+    total_sales_per_product, product_sales_share = sales_aggregates_fast(sales_data_df)
+    return _assemble_final_df_fast(total_sales_per_product, product_sales_share, coffee_products_df)
+
+
+# Engines that build final_df from the files in data_dir. 'parallel' shards the aggregates over a process
+# pool (parallel_processing), 'streaming' reads the sales in chunks and 'sql' runs the aggregates in an
+# embedded database (sql_engine); these are imported only when used.
+ENGINES = ('pandas', 'fast', 'parallel', 'streaming', 'sql')
+
+
+@timed('build_final_df')
+def build_final_df(engine='pandas', data_dir=DATA_DIR):
+    if engine == 'sql':
+        from sql_engine import SqlEngine
+        with SqlEngine(data_dir=data_dir) as sql_engine:
+            return sql_engine.final_df()
+    if engine == 'streaming':
+        from streaming import preprocess_data_streaming
+        coffee_products_df = read_excel_cached(os.path.join(data_dir, DATA_FILES[0]))
+        return preprocess_data_streaming(coffee_products_df, os.path.join(data_dir, DATA_FILES[2]))
+    if engine not in ENGINES:
+        raise ValueError(f'Unknown engine: {engine}')
+
+    coffee_products_df, _, sales_data_df = load_data(data_dir)
+    if engine == 'fast':
+        return preprocess_data_fast(coffee_products_df, sales_data_df)
+    if engine == 'parallel':
+        from parallel_processing import preprocess_data_parallel
+        return preprocess_data_parallel(coffee_products_df, sales_data_df)
+    return preprocess_data(coffee_products_df, sales_data_df)
+
+
 def preprocess_for_roastlevel_analysis(final_df, roast_level):
     roast_df = final_df[final_df['RoastLevel'] == roast_level]
 
-    roastlevel_analysis = (roast_df.groupby('Origin')['AvgMonthlySales']
+    roastlevel_analysis = (roast_df.groupby('Origin', observed=True)['AvgMonthlySales']
                            .mean()
                            .sort_values(ascending=False)
                            .reset_index())
@@ -38,8 +266,62 @@ def preprocess_for_roastlevel_analysis(final_df, roast_level):
     return roastlevel_analysis
 
 
-def preprocess_for_roast_top10(final_df, roast_level):
-    roast10_df = final_df[final_df['RoastLevel'] == roast_level].sort_values(by='AvgMonthlySales', ascending=False)
+def preprocess_for_roast_top10(final_df, roast_level, top_n=10):
+    # nlargest does a partial selection instead of sorting every product at this roast level
+    roast10_df = final_df[final_df['RoastLevel'] == roast_level].nlargest(top_n, 'AvgMonthlySales')
 
     return roast10_df
 
+
+# One row per Origin x RoastLevel cell: combined AvgMonthlySales, product count and best seller
+def preprocess_for_bubble_chart(final_df):
+    cells = final_df.groupby(['Origin', 'RoastLevel'], observed=True, sort=False)
+    bubble_df = cells.agg(AvgMonthlySales=('AvgMonthlySales', 'sum'), Products=('ProductID', 'size'))
+    bubble_df['TopProduct'] = final_df.loc[cells['AvgMonthlySales'].idxmax(), 'ProductName'].to_numpy()
+
+    return bubble_df.reset_index()
+
+
+
+# Prepared once from final_df so that roast-level queries don't rescan it: products are stored in
+# contiguous per-roast-level blocks (categorical codes, each block sorted by AvgMonthlySales) with the
+# block offsets, next to precomputed per roast level x origin means. A query is a slice of a block.
+class RoastLevelIndex:
+    def __init__(self, final_df):
+        products = final_df[final_df['AvgMonthlySales'].notna()].copy()
+        products['RoastLevel'] = products['RoastLevel'].astype('category')
+        products['Origin'] = products['Origin'].astype('category')
+        self.roast_levels = list(products['RoastLevel'].cat.categories)
+
+        codes = products['RoastLevel'].cat.codes.to_numpy()
+        order = np.lexsort((-products['AvgMonthlySales'].to_numpy(), codes))
+        self.products = products.iloc[order]
+        offsets = np.searchsorted(codes[order], np.arange(len(self.roast_levels) + 1))
+        self._blocks = {roast_level: (offsets[i], offsets[i + 1]) for i, roast_level in enumerate(self.roast_levels)}
+
+        origin_means = (final_df.groupby(['RoastLevel', 'Origin'], observed=True)['AvgMonthlySales'].mean()
+                        .dropna().reset_index())
+        origin_means['Origin'] = origin_means['Origin'].astype(products['Origin'].dtype)
+        origin_means = origin_means.sort_values(['RoastLevel', 'AvgMonthlySales'], ascending=[True, False], kind='stable')
+        self._origin_means = {roast_level: group[['Origin', 'AvgMonthlySales']].reset_index(drop=True)
+                              for roast_level, group in origin_means.groupby('RoastLevel', observed=True, sort=False)}
+        self._empty_origin_means = origin_means[['Origin', 'AvgMonthlySales']].iloc[:0]
+
+    # Same result as preprocess_for_roastlevel_analysis
+    def roastlevel_analysis(self, roast_level):
+        return self._origin_means.get(roast_level, self._empty_origin_means)
+
+    # Same result as preprocess_for_roast_top10; top_n=None returns every product at the roast level
+    def top_products(self, roast_level, top_n=10):
+        start, stop = self._blocks.get(roast_level, (0, 0))
+        if top_n is not None:
+            stop = min(stop, start + top_n)
+        return self.products.iloc[start:stop]
+
+    def roastlevel_analysis_many(self, roast_levels):
+        frames = [self.roastlevel_analysis(roast_level).assign(RoastLevel=roast_level) for roast_level in roast_levels]
+        return pd.concat(frames, ignore_index=True) if frames else self._empty_origin_means.assign(RoastLevel=None)
+
+    def top_products_many(self, roast_levels, top_n=10):
+        frames = [self.top_products(roast_level, top_n) for roast_level in roast_levels]
+        return pd.concat(frames) if frames else self.products.iloc[:0]
@@ -0,0 +1,62 @@
+from joblib import dump, load
+
+from data_processing import assemble_final_df
+
+
+# Running state behind preprocess_data: total quantity per product, quantity per (ProductID, YearMonth)
+# and the number of dated sale rows per product. A product's SalesShare is the mean of
+# Quantity / TotalMonthlySales over its dated rows, which equals sum over months of (product-month
+# quantity / monthly total) divided by its dated row count. As in preprocess_data, sales without a date
+# count towards Quantity but not SalesShare. Folding in new rows therefore only touches the state, never
+# the sales history.
+class SalesAggregator:
+    def __init__(self):
+        self.product_quantity = None
+        self.product_month_quantity = None
+        self.product_sale_counts = None
+        self.rows_seen = 0
+
+    def update(self, new_sales_df):
+        if new_sales_df.empty:
+            return self
+        product_quantity = new_sales_df.groupby('ProductID')['Quantity'].sum()
+        # groupby drops the rows without a date (NaT period) from both of these
+        year_month = new_sales_df['SaleDate'].dt.to_period('M').rename('YearMonth')
+        quantity = new_sales_df.groupby([new_sales_df['ProductID'], year_month])['Quantity'].sum()
+        counts = new_sales_df.groupby(new_sales_df['ProductID'].where(year_month.notna())).size()
+
+        if self.product_quantity is None:
+            self.product_quantity = product_quantity.astype('int64')
+            self.product_month_quantity = quantity.astype('int64')
+            self.product_sale_counts = counts.astype('int64')
+        else:
+            self.product_quantity = self.product_quantity.add(product_quantity, fill_value=0).astype('int64')
+            self.product_month_quantity = self.product_month_quantity.add(quantity, fill_value=0).astype('int64')
+            self.product_sale_counts = self.product_sale_counts.add(counts, fill_value=0).astype('int64')
+        self.rows_seen += len(new_sales_df)
+        return self
+
+    # Sales data is append-only, so only the rows past rows_seen are new
+    def refresh(self, sales_data_df):
+        return self.update(sales_data_df.iloc[self.rows_seen:])
+
+    def sales_aggregates(self):
+        if self.product_quantity is None:
+            raise ValueError('No sales rows have been folded in yet')
+        quantity = self.product_month_quantity
+        total_sales_per_product = self.product_quantity
+        monthly_total_sales = quantity.groupby(level='YearMonth').sum()
+        shares = quantity / monthly_total_sales.reindex(quantity.index.get_level_values('YearMonth')).to_numpy()
+        product_sales_share = shares.groupby(level='ProductID').sum() / self.product_sale_counts
+        return total_sales_per_product, product_sales_share
+
+    def final_df(self, coffee_products_df):
+        total_sales_per_product, product_sales_share = self.sales_aggregates()
+        return assemble_final_df(total_sales_per_product, product_sales_share, coffee_products_df)
+
+    def save(self, path):
+        dump(self, path)
+
+    @staticmethod
+    def load(path):
+        return load(path)
@@ -0,0 +1,161 @@
+import atexit
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+
+# Set to 1 to collect timings and counters, or to 'profile' to also run cProfile inside profile() blocks
+METRICS_ENV = 'COFFEE_METRICS'
+# When set, the collected metrics are written to this JSON file at exit
+METRICS_FILE_ENV = 'COFFEE_METRICS_FILE'
+PROFILES_DIR = os.path.join('metrics', 'profiles')
+SPAN_WINDOW = 1000
+
+_lock = threading.Lock()
+_durations = defaultdict(lambda: deque(maxlen=SPAN_WINDOW))
+_counts = defaultdict(int)
+_counters = defaultdict(int)
+_profiles = {}
+_enabled = os.environ.get(METRICS_ENV, '') not in ('', '0')
+_profiling = os.environ.get(METRICS_ENV, '') == 'profile'
+
+
+def enabled():
+    return _enabled
+
+
+def profiling():
+    return _profiling
+
+
+def enable(flag=True, profile=False):
+    global _enabled, _profiling
+    _enabled, _profiling = flag, flag and profile
+
+
+def reset():
+    with _lock:
+        _durations.clear()
+        _counts.clear()
+        _counters.clear()
+        _profiles.clear()
+
+
+def record(name, seconds):
+    with _lock:
+        _durations[name].append(seconds)
+        _counts[name] += 1
+
+
+def incr(name, n=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] += n
+
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, time.perf_counter() - self.start)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+# Times the block under `name`. While metrics are off this is a flag check and a shared no-op object.
+def span(name):
+    return _Span(name) if _enabled else _NULL_SPAN
+
+
+def timed(name):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Runs cProfile over the block when profiling is on; the stats are kept for the diagnostics page and
+# dumped to metrics/profiles/<name>.prof for snakeviz or pstats
+@contextmanager
+def profile(name, top_n=25):
+    if not _profiling:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(PROFILES_DIR, exist_ok=True)
+        profiler.dump_stats(os.path.join(PROFILES_DIR, name + '.prof'))
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(top_n)
+        with _lock:
+            _profiles[name] = report.getvalue()
+
+
+def summary():
+    with _lock:
+        durations = {name: np.array(values) for name, values in _durations.items()}
+        counts = dict(_counts)
+        counters = dict(_counters)
+
+    spans = {}
+    for name, values in sorted(durations.items()):
+        ms = values * 1000
+        spans[name] = {'count': counts[name], 'mean_ms': float(ms.mean()), 'p50_ms': float(np.percentile(ms, 50)),
+                       'p95_ms': float(np.percentile(ms, 95)), 'max_ms': float(ms.max())}
+
+    # Caches count '<cache>.lookups' and '<cache>.misses'
+    cache_hit_rates = {}
+    for name, lookups in counters.items():
+        if name.endswith('.lookups') and lookups:
+            cache = name[:-len('.lookups')]
+            cache_hit_rates[cache] = 1 - counters.get(cache + '.misses', 0) / lookups
+    return {'enabled': _enabled, 'spans': spans, 'counters': dict(sorted(counters.items())),
+            'cache_hit_rates': dict(sorted(cache_hit_rates.items()))}
+
+
+def profiles():
+    with _lock:
+        return dict(_profiles)
+
+
+def export_json(path):
+    with open(path, 'w') as f:
+        json.dump(summary(), f, indent=2)
+
+
+if os.environ.get(METRICS_FILE_ENV):
+    atexit.register(lambda: export_json(os.environ[METRICS_FILE_ENV]))
@@ -1,71 +1,200 @@
+import argparse
+import os
+import time
+
+import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split, GridSearchCV
+from scipy.stats import randint
+from sklearn.base import clone
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import train_test_split, GridSearchCV, HalvingGridSearchCV, RandomizedSearchCV
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import make_pipeline
 from sklearn.metrics import classification_report
-from joblib import dump
-import os
-from data_processing import load_data, preprocess_data
+from joblib import Memory, dump, load
+from compact_model import COMPACT_MODEL_DIR, export_compact_model
+from data_processing import DATA_DIR, data_signature, load_data, preprocess_data
+from schema import SCHEMA_VERSION
 
-# Load and preprocess the data
-coffee_products_df, customers_data_df, sales_data_df = load_data()
-final_df = preprocess_data(coffee_products_df, sales_data_df)
+MODELS_DIR = 'models'
+CACHE_DIR = os.path.join(MODELS_DIR, 'cache')
+# Bumped whenever preprocess_data or build_training_data change what they produce, so a cached training
+# frame built by older code is rebuilt rather than reused
+TRAINING_DATA_VERSION = 1
+FEATURES = ['Origin_TargetEncoded', 'RoastLevel_TargetEncoded', 'Price']
+PARAM_GRID = {
+    'randomforestclassifier__n_estimators': [10, 50, 100, 200],
+    'randomforestclassifier__max_depth': [None, 10, 20, 30],
+}
+PARAM_DISTRIBUTIONS = {
+    'randomforestclassifier__n_estimators': randint(10, 301),
+    'randomforestclassifier__max_depth': [None, 5, 10, 15, 20, 25, 30, 40],
+    'randomforestclassifier__min_samples_leaf': randint(1, 5),
+}
 
-# Create Target Encoded features
-origin_means = final_df.groupby('Origin')['CompositeMetric'].mean().to_dict()
-roastlevel_means = final_df.groupby('RoastLevel')['CompositeMetric'].mean().to_dict()
 
-final_df['Origin_TargetEncoded'] = final_df['Origin'].map(origin_means)
-final_df['RoastLevel_TargetEncoded'] = final_df['RoastLevel'].map(roastlevel_means)
+# Categorize products based on CompositeMetric
+def categorize_performance(metric, low_threshold, high_threshold):
+    return np.select([metric <= low_threshold, metric <= high_threshold], ['Low', 'Medium'], default='High')
 
-# Define thresholds for categorization based on quantiles of CompositeMetric
-low_threshold, high_threshold = final_df['CompositeMetric'].quantile([0.33, 0.66]).tolist()
 
-# Categorize products based on CompositeMetric
-def categorize_performance(metric):
-    if metric <= low_threshold:
-        return 'Low'
-    elif metric <= high_threshold:
-        return 'Medium'
+def build_training_data(final_df):
+    # Create Target Encoded features
+    origin_means = final_df.groupby('Origin', observed=True)['CompositeMetric'].mean().to_dict()
+    roastlevel_means = final_df.groupby('RoastLevel', observed=True)['CompositeMetric'].mean().to_dict()
+
+    # Mapping a categorical column gives a categorical result; the features are plain floats
+    final_df['Origin_TargetEncoded'] = final_df['Origin'].map(origin_means).astype(float)
+    final_df['RoastLevel_TargetEncoded'] = final_df['RoastLevel'].map(roastlevel_means).astype(float)
+
+    # Define thresholds for categorization based on quantiles of CompositeMetric
+    low_threshold, high_threshold = final_df['CompositeMetric'].quantile([0.33, 0.66]).tolist()
+    final_df['PerformanceCategory'] = categorize_performance(final_df['CompositeMetric'], low_threshold, high_threshold)
+
+    return final_df, origin_means, roastlevel_means, (low_threshold, high_threshold)
+
+
+# The training frame only changes when the Excel inputs do, so it is cached next to the models and
+# keyed by the data files' signature
+def load_training_data(data_dir=DATA_DIR, cache_dir=CACHE_DIR, use_cache=True):
+    signature = data_signature(data_dir)
+    version = [TRAINING_DATA_VERSION, SCHEMA_VERSION]
+    cache_path = os.path.join(cache_dir, 'training_data.joblib')
+    if use_cache and os.path.exists(cache_path):
+        cached = load(cache_path)
+        if cached['signature'] == signature and cached.get('version') == version:
+            return cached['training_data']
+
+    coffee_products_df, customers_data_df, sales_data_df = load_data(data_dir)
+    final_df = preprocess_data(coffee_products_df, sales_data_df)
+    training_data = build_training_data(final_df)
+    if use_cache:
+        os.makedirs(cache_dir, exist_ok=True)
+        dump({'signature': signature, 'version': version, 'training_data': training_data}, cache_path)
+    return training_data
+
+
+def make_model(memory=None):
+    return make_pipeline(StandardScaler(), RandomForestClassifier(random_state=42), memory=memory)
+
+
+def _search_results(cv_results):
+    results = pd.DataFrame(cv_results)
+    # Fit and score time of the configuration summed over its CV splits. With n_jobs != 1 the splits run
+    # concurrently, so this is compute time, not the elapsed time of the search.
+    n_splits = sum(1 for key in cv_results if key.startswith('split') and key.endswith('_test_score'))
+    results['fold_seconds'] = (results['mean_fit_time'] + results['mean_score_time']) * n_splits
+    return results
+
+
+# Randomized search in rounds of n_iter candidates until the time budget runs out; the budget is checked
+# between rounds, so the last round may overrun it
+def _randomized_search_with_budget(model, X_train, y_train, n_iter, time_budget, n_jobs, cv):
+    deadline = time.perf_counter() + (time_budget or 0)
+    rounds = []
+    while not rounds or time.perf_counter() < deadline:
+        search = RandomizedSearchCV(model, PARAM_DISTRIBUTIONS, n_iter=n_iter, cv=cv, scoring='accuracy',
+                                    n_jobs=n_jobs, random_state=42 + len(rounds), refit=False)
+        search.fit(X_train, y_train)
+        rounds.append(_search_results(search.cv_results_))
+
+    results = pd.concat(rounds, ignore_index=True)
+    best = results.loc[results['mean_test_score'].idxmax()]
+    best_model = clone(model).set_params(**best['params']).fit(X_train, y_train)
+    return best_model, best['params'], best['mean_test_score'], results
+
+
+def run_search(X_train, y_train, search='grid', n_jobs=-1, cv=5, n_iter=16, time_budget=None, memory=None):
+    model = make_model(memory)
+    if search == 'random':
+        return _randomized_search_with_budget(model, X_train, y_train, n_iter, time_budget, n_jobs, cv)
+
+    if search == 'halving':
+        # Trees are the budget being halved: every depth starts with a small forest and only the best
+        # depths are refitted with more trees, up to the largest forest in PARAM_GRID
+        n_estimators = PARAM_GRID['randomforestclassifier__n_estimators']
+        search_cv = HalvingGridSearchCV(model, {'randomforestclassifier__max_depth': PARAM_GRID['randomforestclassifier__max_depth']},
+                                        resource='randomforestclassifier__n_estimators', min_resources=min(n_estimators),
+                                        max_resources=max(n_estimators), cv=cv, scoring='accuracy', n_jobs=n_jobs,
+                                        random_state=42)
+    elif search == 'grid':
+        search_cv = GridSearchCV(model, PARAM_GRID, cv=cv, scoring='accuracy', n_jobs=n_jobs)
     else:
-        return 'High'
+        raise ValueError(f'Unknown search mode: {search}')
+    search_cv.fit(X_train, y_train)
+    return search_cv.best_estimator_, search_cv.best_params_, search_cv.best_score_, _search_results(search_cv.cv_results_)
 
-final_df['PerformanceCategory'] = final_df['CompositeMetric'].apply(categorize_performance)
 
-# Prepare features and target for model training
-features = final_df[['Origin_TargetEncoded', 'RoastLevel_TargetEncoded', 'Price']]
-target = final_df['PerformanceCategory']
+def report_search(results):
+    columns = ['params', 'mean_test_score', 'fold_seconds']
+    if 'iter' in results:
+        columns.append('iter')
+    report = results.sort_values('mean_test_score', ascending=False)[columns]
+    print('Configurations by cross-validation score (fold_seconds summed over all folds):')
+    with pd.option_context('display.max_colwidth', None, 'display.width', 200):
+        print(report.to_string(index=False))
 
-# Split dataset
-X_train, X_test, y_train, y_test = train_test_split(features, target, random_state=42)
 
-# Model training
-model = make_pipeline(StandardScaler(), RandomForestClassifier(random_state=42))
-param_grid = {
-    'randomforestclassifier__n_estimators': [10, 50, 100, 200],
-    'randomforestclassifier__max_depth': [None, 10, 20, 30],
-}
-grid_search = GridSearchCV(model, param_grid, cv=5, scoring='accuracy')
-grid_search.fit(X_train, y_train)
-best_model = grid_search.best_estimator_
-
-# Save the trained model and feature importance
-models_dir = 'models'
-os.makedirs(models_dir, exist_ok=True)
-dump(best_model, os.path.join(models_dir, 'your_model.joblib'))
-
-feature_importance = best_model.named_steps['randomforestclassifier'].feature_importances_
-features_list = ['Origin_TargetEncoded', 'RoastLevel_TargetEncoded', 'Price']
-feature_importance_data = dict(zip(features_list, feature_importance))
-dump(feature_importance_data, os.path.join(models_dir, 'feature_importance.joblib'))
-
-# Evaluation and reporting
-print("Best parameters:", grid_search.best_params_)
-print("Best cross-validation score: {:.2f}".format(grid_search.best_score_))
-y_pred_best = best_model.predict(X_test)
-print(classification_report(y_test, y_pred_best))
-
-# Save encoding dictionaries for future predictions
-dump(origin_means, os.path.join(models_dir, 'origin_means.joblib'))
-dump(roastlevel_means, os.path.join(models_dir, 'roastlevel_means.joblib'))
+def save_artifacts(best_model, origin_means, roastlevel_means, models_dir=MODELS_DIR):
+    # Save the trained model and feature importance
+    os.makedirs(models_dir, exist_ok=True)
+    dump(best_model, os.path.join(models_dir, 'your_model.joblib'))
+
+    feature_importance = best_model.named_steps['randomforestclassifier'].feature_importances_
+    feature_importance_data = dict(zip(FEATURES, feature_importance))
+    dump(feature_importance_data, os.path.join(models_dir, 'feature_importance.joblib'))
+
+    # Save encoding dictionaries for future predictions
+    dump(origin_means, os.path.join(models_dir, 'origin_means.joblib'))
+    dump(roastlevel_means, os.path.join(models_dir, 'roastlevel_means.joblib'))
+
+    # Flat array export the app loads instead of unpickling the pipeline
+    export_compact_model(best_model, origin_means, roastlevel_means, os.path.join(models_dir, COMPACT_MODEL_DIR),
+                         source_path=os.path.join(models_dir, 'your_model.joblib'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the sales performance model.')
+    parser.add_argument('--search', choices=['grid', 'halving', 'random'], default='grid',
+                        help='Full grid search, successive halving over the grid, or randomized search.')
+    parser.add_argument('--n-jobs', type=int, default=-1, help='Parallel workers for the search (-1 uses all cores).')
+    parser.add_argument('--n-iter', type=int, default=16, help='Candidates per randomized search round.')
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help='Seconds to keep running randomized search rounds for.')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Rebuild the training data and skip memoising the fitted scaler.')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    final_df, origin_means, roastlevel_means, _ = load_training_data(use_cache=not args.no_cache)
+    print(f'Training data ready in {time.perf_counter() - start:.2f}s')
+
+    # Prepare features and target for model training
+    features = final_df[FEATURES]
+    target = final_df['PerformanceCategory']
+
+    # Split dataset
+    X_train, X_test, y_train, y_test = train_test_split(features, target, random_state=42)
+
+    # Every configuration refits the same scaler on the same folds, so the fitted step is memoised
+    memory = None if args.no_cache else Memory(os.path.join(CACHE_DIR, 'pipeline'), verbose=0)
+    start = time.perf_counter()
+    best_model, best_params, best_score, results = run_search(X_train, y_train, args.search, args.n_jobs,
+                                                              n_iter=args.n_iter, time_budget=args.time_budget,
+                                                              memory=memory)
+    best_model.set_params(memory=None)
+    print(f'Search finished in {time.perf_counter() - start:.2f}s')
+    report_search(results)
+
+    save_artifacts(best_model, origin_means, roastlevel_means)
+
+    # Evaluation and reporting
+    print("Best parameters:", best_params)
+    print("Best cross-validation score: {:.2f}".format(best_score))
+    y_pred_best = best_model.predict(X_test)
+    print(classification_report(y_test, y_pred_best))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,35 +1,57 @@
 import streamlit as st
-import pandas as pd
+from app_cache import get_filter_mask, get_sort_order, get_summary_statistics, get_table
+from data_explorer import page_rows, select_rows
 
-# Function to load data into session state if it doesn't exist
-def load_data():
-    if 'coffee_products_df' not in st.session_state:
-        st.session_state.coffee_products_df = pd.read_excel('data/Coffee_Products.xlsx', engine='openpyxl')
-    if 'customers_data_df' not in st.session_state:
-        st.session_state.customers_data_df = pd.read_excel('data/Customers_Data.xlsx', engine='openpyxl')
-    if 'sales_data_df' not in st.session_state:
-        st.session_state.sales_data_df = pd.read_excel('data/Sales_Data.xlsx', engine='openpyxl')
-
-# Call the load_data function to ensure data is loaded
-load_data()
+# Datasets and their descriptions; rows are filtered, sorted and paged on the server and only the
+# visible page is sent to the browser
+DATASETS = {
+    'Coffee Products Data': ('Coffee_Products.xlsx', "Below is the dataset used for coffee products in our model:"),
+    'Customer Data': ('Customers_Data.xlsx', "Below is the dataset used for customers data in our model:"),
+    'Sales Data': ('Sales_Data.xlsx', "Below is the dataset used for sales data in our model:"),
+}
+PAGE_SIZES = [25, 50, 100, 250]
 
 # Page header
 st.header('Data Overview for Coffee Products Model')
 
-# Section for Coffee Productspip
-st.subheader('Coffee Products Data')
-st.write("Below is the dataset used for coffee products in our model:")
-st.dataframe(st.session_state.coffee_products_df)
+dataset = st.selectbox('Dataset', options=list(DATASETS))
+file_name, description = DATASETS[dataset]
+table = get_table(file_name)
+
+st.subheader(dataset)
+st.write(description)
+
+# Summary statistics are computed once per data version
+with st.expander('Summary statistics'):
+    st.dataframe(get_summary_statistics(file_name), hide_index=True)
+
+# View controls
+columns = st.multiselect('Columns', options=table.column_names, default=table.column_names)
+filter_col, text_col = st.columns(2)
+filter_column = filter_col.selectbox('Filter column', options=[None] + table.column_names,
+                                     format_func=lambda column: 'No filter' if column is None else column)
+filter_text = text_col.text_input('Contains / equals', disabled=filter_column is None)
+sort_col, order_col, size_col = st.columns(3)
+sort_column = sort_col.selectbox('Sort by', options=[None] + table.column_names,
+                                 format_func=lambda column: 'File order' if column is None else column)
+ascending = order_col.radio('Order', options=['Ascending', 'Descending'], horizontal=True) == 'Ascending'
+page_size = size_col.selectbox('Rows per page', options=PAGE_SIZES, index=1)
 
-# Section for Customer Data
-st.subheader('Customer Data')
-st.write("Below is the dataset used for customers data in our model:")
-st.dataframe(st.session_state.customers_data_df)
+order = get_sort_order(file_name, sort_column, ascending) if sort_column is not None else None
+mask = get_filter_mask(file_name, filter_column, filter_text) if filter_column is not None and filter_text else None
+rows = select_rows(table.num_rows, order, mask)
+n_matching = table.num_rows if rows is None else len(rows)
+n_pages = max((n_matching + page_size - 1) // page_size, 1)
 
-# Section for Sales Data
-st.subheader('Sales Data')
-st.write("Below is the dataset used for sales data in our model:")
-st.dataframe(st.session_state.sales_data_df)
+# The page number starts again from 1 whenever the view changes
+view_key = f'page-{file_name}-{filter_column}-{filter_text}-{sort_column}-{ascending}-{page_size}'
+page = st.number_input(f'Page (of {n_pages})', min_value=1, max_value=n_pages, value=1, step=1, key=view_key)
+page = min(page, n_pages)
+page_df, _ = page_rows(table, rows, page - 1, page_size, columns)
+st.dataframe(page_df)
+first_row = (page - 1) * page_size
+st.caption(f'Showing rows {first_row + 1 if len(page_df) else 0}-{first_row + len(page_df)} '
+           f'of {n_matching:,} matching ({table.num_rows:,} total)')
 
 # Optionally, you can add explanations or descriptions using markdown
 st.markdown("""
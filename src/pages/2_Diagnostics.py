@@ -0,0 +1,51 @@
+import json
+
+import pandas as pd
+import streamlit as st
+from instrumentation import METRICS_ENV, enable, enabled, profiles, profiling, reset, summary
+
+# Page header
+st.header('Diagnostics')
+st.write('Where the time goes in this app process: timings per stage, cache hit rates and rows processed.')
+
+if not enabled():
+    st.info(f'Metrics are off. Start the app with {METRICS_ENV}=1 (or {METRICS_ENV}=profile to also run cProfile '
+            'on predictions), or turn collection on for this process below.')
+
+collect_col, profile_col, reset_col = st.columns(3)
+collect = collect_col.toggle('Collect metrics', value=enabled())
+profile = profile_col.toggle('Profile predictions', value=profiling(), disabled=not collect)
+if (collect, collect and profile) != (enabled(), profiling()):
+    enable(collect, profile)
+if reset_col.button('Reset'):
+    reset()
+
+metrics = summary()
+
+st.subheader('Stages')
+if metrics['spans']:
+    spans_df = pd.DataFrame.from_dict(metrics['spans'], orient='index')
+    spans_df.index.name = 'Stage'
+    st.dataframe(spans_df.style.format({'mean_ms': '{:.2f}', 'p50_ms': '{:.2f}', 'p95_ms': '{:.2f}', 'max_ms': '{:.2f}'}))
+else:
+    st.write('No timings recorded yet.')
+
+st.subheader('Cache hit rates')
+if metrics['cache_hit_rates']:
+    st.dataframe(pd.Series(metrics['cache_hit_rates'], name='Hit rate').rename_axis('Cache').to_frame()
+                 .style.format('{:.1%}'))
+else:
+    st.write('No cache lookups recorded yet.')
+
+st.subheader('Counters')
+if metrics['counters']:
+    st.dataframe(pd.Series(metrics['counters'], name='Value').rename_axis('Counter').to_frame())
+else:
+    st.write('No counters recorded yet.')
+
+for name, report in profiles().items():
+    with st.expander(f'Profile: {name}'):
+        st.code(report)
+
+st.download_button('Download metrics (JSON)', json.dumps(metrics, indent=2), file_name='metrics.json',
+                   mime='application/json')
@@ -0,0 +1,196 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from data_processing import _assemble_final_df_fast, _month_codes, preprocess_data_fast
+from synthetic_data import generate_data
+
+
+# The coded sales columns live in shared memory blocks; workers attach to them by name, so only the
+# block names and row ranges are pickled, never the frames. empty maps names to (shape, dtype) for
+# blocks the workers fill in, which are created without copying anything into them.
+class SharedArrays:
+    def __init__(self, arrays, empty=None):
+        self.blocks = {}
+        self.specs = {}
+        for name, array in arrays.items():
+            self._create(name, array.shape, array.dtype)[:] = array
+        for name, (shape, dtype) in (empty or {}).items():
+            self._create(name, shape, np.dtype(dtype))
+
+    def _create(self, name, shape, dtype):
+        block = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+        self.blocks[name] = block
+        self.specs[name] = (block.name, shape, dtype.str)
+        return np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+
+
+def _attach(specs):
+    blocks, arrays = [], {}
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return blocks, arrays
+
+
+def _run_attached(func, specs, *args):
+    blocks, arrays = _attach(specs)
+    try:
+        return func(arrays, *args)
+    finally:
+        # The arrays are views into the blocks, so they must go before the blocks close
+        del arrays
+        for block in blocks:
+            block.close()
+
+
+# Phase 1, per row range: partial per-product and per-month quantity sums
+def _partial_sums(arrays, start, stop, n_products, n_months):
+    product_codes = arrays['product_codes'][start:stop]
+    month_codes = arrays['month_codes'][start:stop]
+    quantity = arrays['quantity'][start:stop]
+    product_quantity = np.bincount(product_codes, weights=quantity, minlength=n_products).astype(np.int64)
+    dated = month_codes >= 0
+    monthly_quantity = np.bincount(month_codes[dated], weights=quantity[dated], minlength=n_months).astype(np.int64)
+    return product_quantity, monthly_quantity
+
+
+# Also in phase 1: the range's dated rows ordered by product, written to its slice of the shared order
+# array (undated rows go last). The sort is stable, so each product's rows keep their original order, and
+# on 16-bit keys numpy sorts in linear time. Returns the number of the range's dated rows per product.
+def _order_range(arrays, start, stop, n_products):
+    key = np.where(arrays['month_codes'][start:stop] >= 0, arrays['product_codes'][start:stop], n_products)
+    key = key.astype(np.uint16 if n_products < 2 ** 16 else np.int64)
+    arrays['order'][start:stop] = np.argsort(key, kind='stable') + start
+    return np.bincount(key, minlength=n_products + 1)[:n_products]
+
+
+def _phase_one(arrays, start, stop, n_products, n_months):
+    return _partial_sums(arrays, start, stop, n_products, n_months) + (_order_range(arrays, start, stop, n_products),)
+
+
+# Phase 2, per range of products: the mean share of every product in the range. Its rows are taken from
+# each phase 1 range in turn (offsets[r] to ends[r] of range r's ordered rows), so every product's rows
+# are in their original order and pandas' grouped mean over them is bit-identical to preprocess_data.
+def _range_sales_share(arrays, offsets, ends, monthly_total_sales):
+    rows = np.concatenate([arrays['order'][offset:end] for offset, end in zip(offsets, ends)])
+    product_codes = arrays['product_codes'][rows]
+    sales_share = arrays['quantity'][rows] / monthly_total_sales[arrays['month_codes'][rows]]
+    product_sales_share = pd.Series(sales_share).groupby(product_codes).mean()
+    return product_sales_share.index.to_numpy(), product_sales_share.to_numpy()
+
+
+def sales_aggregates_parallel(sales_data_df, n_workers=None):
+    n_workers = n_workers or os.cpu_count()
+    product_codes, product_ids = pd.factorize(sales_data_df['ProductID'], sort=True)
+    month_codes, n_months = _month_codes(sales_data_df['SaleDate'].to_numpy())
+    quantity = sales_data_df['Quantity'].to_numpy()
+    if not np.issubdtype(quantity.dtype, np.integer):
+        # Float quantities need pandas' summation to match preprocess_data exactly
+        raise ValueError('The parallel path needs integer quantities; use preprocess_data_fast instead')
+    n_products, n_rows = len(product_ids), len(quantity)
+    arrays = {'product_codes': product_codes, 'month_codes': month_codes, 'quantity': quantity}
+
+    if n_workers == 1:
+        partials = [_partial_sums(arrays, 0, n_rows, n_products, n_months)]
+        dated = month_codes >= 0
+        sales_share = quantity[dated] / partials[0][1][month_codes[dated]]
+        product_sales_share = pd.Series(sales_share).groupby(product_codes[dated]).mean()
+        shares = [(product_sales_share.index.to_numpy(), product_sales_share.to_numpy())]
+    else:
+        bounds = np.linspace(0, n_rows, n_workers + 1).astype(np.int64)
+        # Codes fit in 32 bits, which halves what is copied into shared memory
+        shared_arrays = dict(arrays, product_codes=product_codes.astype(np.int32),
+                             month_codes=month_codes.astype(np.int32))
+        with SharedArrays(shared_arrays, empty={'order': ((n_rows,), np.int64)}) as shared, \
+                ProcessPoolExecutor(n_workers) as pool:
+            phase_one = list(pool.map(partial(_run_attached, _phase_one, shared.specs), bounds[:-1], bounds[1:],
+                                      [n_products] * n_workers, [n_months] * n_workers))
+            partials = [(product, monthly) for product, monthly, _ in phase_one]
+            # Integer sums, so merging the partials in any order is exact
+            monthly_total_sales = np.sum([monthly for _, monthly in partials], axis=0)
+
+            # Where each product's rows start in each range's slice of order, and product ranges with
+            # about equal numbers of dated rows for phase 2
+            counts = np.array([range_counts for _, _, range_counts in phase_one])
+            starts = bounds[:-1, None] + np.concatenate([np.zeros((n_workers, 1), np.int64),
+                                                         np.cumsum(counts, axis=1)], axis=1)
+            cumulative = np.concatenate([[0], np.cumsum(counts.sum(axis=0))])
+            product_bounds = np.searchsorted(cumulative, np.linspace(0, cumulative[-1], n_workers + 1))
+            product_bounds[0], product_bounds[-1] = 0, n_products
+            shares = list(pool.map(partial(_run_attached, _range_sales_share, shared.specs),
+                                   [starts[:, first] for first in product_bounds[:-1]],
+                                   [starts[:, last] for last in product_bounds[1:]],
+                                   [monthly_total_sales] * n_workers))
+
+    total_sales_per_product = pd.Series(np.sum([product for product, _ in partials], axis=0),
+                                        index=pd.Index(product_ids, name='ProductID'))
+    # The product ranges are in order, so the concatenated results are too
+    codes = np.concatenate([codes for codes, _ in shares])
+    means = np.concatenate([means for _, means in shares])
+    product_sales_share = pd.Series(means, index=pd.Index(product_ids[codes], name='ProductID'))
+    return total_sales_per_product, product_sales_share
+
+
+def preprocess_data_parallel(coffee_products_df, sales_data_df, n_workers=None):
+    total_sales_per_product, product_sales_share = sales_aggregates_parallel(sales_data_df, n_workers)
+    return _assemble_final_df_fast(total_sales_per_product, product_sales_share, coffee_products_df)
+
+
+# Timings of the parallel path for 1..max_workers workers; speedup and efficiency are relative to the
+# single-process preprocess_data_fast (the first row), which is what the parallel path has to beat
+def scaling_report(n_sales, n_products, max_workers, repeat=3, seed=0):
+    coffee_products_df, _, sales_data_df = generate_data(n_products=n_products, n_sales=n_sales, seed=seed)
+
+    def best_time(func):
+        best = float('inf')
+        for _ in range(repeat):
+            products, sales = coffee_products_df.copy(deep=False), sales_data_df.copy(deep=False)
+            start = time.perf_counter()
+            final_df = func(products, sales)
+            best = min(best, time.perf_counter() - start)
+        return best, final_df
+
+    fast_seconds, expected = best_time(preprocess_data_fast)
+    rows = [{'engine': 'preprocess_data_fast', 'workers': 1, 'seconds': fast_seconds}]
+    for n_workers in range(1, max_workers + 1):
+        seconds, final_df = best_time(partial(preprocess_data_parallel, n_workers=n_workers))
+        pd.testing.assert_frame_equal(final_df, expected, check_exact=True)
+        rows.append({'engine': 'parallel', 'workers': n_workers, 'seconds': seconds})
+
+    report = pd.DataFrame(rows)
+    report['speedup'] = fast_seconds / report['seconds']
+    report['efficiency'] = report['speedup'] / report['workers']
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scaling report for the parallel preprocessing path on synthetic data.')
+    parser.add_argument('--sales', type=int, default=5_000_000)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f'{args.sales:,} sale rows, {args.products:,} products, {os.cpu_count()} cores available')
+    report = scaling_report(args.sales, args.products, args.max_workers, args.repeat)
+    print(report.to_string(index=False, float_format='{:.3f}'.format))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from data_processing import DATA_FILES, ENGINES, build_final_df, preprocess_data
+from incremental import SalesAggregator
+from schema import CUSTOMERS_SCHEMA, PRODUCTS_SCHEMA, SALES_SCHEMA, enforce_schema
+from streaming import preprocess_data_streaming
+from synthetic_data import generate_data, write_excel
+
+
+# Synthetic data with a share of the sale dates blanked out, since undated sales count towards Quantity
+# but not SalesShare and each engine has to handle them explicitly. The frames get the dtypes load_data
+# gives them.
+def undated_sales_data(n_products, n_sales, undated_fraction, seed):
+    coffee_products_df, customers_data_df, sales_data_df = generate_data(n_products=n_products, n_sales=n_sales,
+                                                                         seed=seed)
+    rng = np.random.default_rng(seed)
+    undated = rng.random(n_sales) < undated_fraction
+    sales_data_df['SaleDate'] = sales_data_df['SaleDate'].mask(undated)
+    return (enforce_schema(coffee_products_df, PRODUCTS_SCHEMA, 'products'),
+            enforce_schema(customers_data_df, CUSTOMERS_SCHEMA, 'customers'),
+            enforce_schema(sales_data_df, SALES_SCHEMA, 'sales'))
+
+
+# The incremental aggregator regroups the shares by month before averaging, so it matches preprocess_data
+# up to float rounding in SalesShare rather than bit for bit
+def check_incremental(coffee_products_df, sales_data_df, expected, n_batches):
+    aggregator = SalesAggregator()
+    bounds = np.linspace(0, len(sales_data_df), n_batches + 1).astype(int)
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        aggregator.update(sales_data_df.iloc[start:stop])
+    pd.testing.assert_frame_equal(aggregator.final_df(coffee_products_df.copy(deep=False)), expected)
+
+
+# The streaming engine reads the sales file in chunks; in a Parquet file the undated sales are nulls
+def check_streaming(coffee_products_df, sales_data_df, expected, chunksize):
+    with tempfile.TemporaryDirectory() as directory:
+        sales_path = os.path.join(directory, 'sales.parquet')
+        sales_data_df.to_parquet(sales_path, index=False)
+        final_df = preprocess_data_streaming(coffee_products_df.copy(deep=False), sales_path, chunksize)
+    pd.testing.assert_frame_equal(final_df, expected)
+
+
+# Every build_final_df engine against the pandas one, on the data written out as the Excel inputs, where
+# the undated sales are blank SaleDate cells
+def check_engines(coffee_products_df, customers_data_df, sales_data_df):
+    with tempfile.TemporaryDirectory() as data_dir:
+        write_excel(data_dir, coffee_products_df, customers_data_df, sales_data_df)
+        expected = build_final_df('pandas', data_dir)
+        for engine in ENGINES:
+            pd.testing.assert_frame_equal(build_final_df(engine, data_dir), expected, obj=f'{engine} final_df')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the alternative preprocessing engines against preprocess_data '
+                                                 'on synthetic data with undated sales.')
+    parser.add_argument('--products', type=int, default=50)
+    parser.add_argument('--sales', type=int, default=20_000)
+    parser.add_argument('--undated-fraction', type=float, default=0.01)
+    parser.add_argument('--batches', type=int, default=7, help='Batches the sales are folded in as.')
+    parser.add_argument('--chunksize', type=int, default=3000, help='Chunk size for the streaming engine.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    coffee_products_df, customers_data_df, sales_data_df = undated_sales_data(args.products, args.sales, args.undated_fraction, args.seed)
+    expected = preprocess_data(coffee_products_df.copy(deep=False), sales_data_df.copy(deep=False))
+    print(f"{sales_data_df['SaleDate'].isna().sum():,} of {len(sales_data_df):,} sales have no date")
+
+    check_incremental(coffee_products_df, sales_data_df, expected, args.batches)
+    print('incremental: matches preprocess_data')
+    check_streaming(coffee_products_df, sales_data_df, expected, args.chunksize)
+    print('streaming: matches preprocess_data')
+    check_engines(coffee_products_df, customers_data_df, sales_data_df)
+    print(f"{', '.join(ENGINES)} engines: match on the Excel inputs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+import argparse
+import asyncio
+import json
+import time
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import tornado.web
+
+from scoring import CANDIDATE_COLUMNS, load_scoring_artifacts, score_candidates
+
+DEFAULT_PORT = 8600
+DEFAULT_MAX_BATCH_SIZE = 256
+DEFAULT_MAX_WAIT_MS = 5.0
+LATENCY_WINDOW = 10_000
+
+
+# Collects concurrent prediction requests into micro-batches: the first request in the queue opens a
+# window of max_wait seconds (closed early at max_batch_size), and the whole batch is scored with one
+# score_candidates call in a worker thread, so the event loop keeps accepting requests meanwhile.
+class MicroBatcher:
+    def __init__(self, model, origin_means, roastlevel_means, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 max_wait=DEFAULT_MAX_WAIT_MS / 1000, workers=1):
+        self.model = model
+        self.origin_means = origin_means
+        self.roastlevel_means = roastlevel_means
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.slots = asyncio.Semaphore(workers)
+        self.queue = asyncio.Queue()
+
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.batches = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    async def predict(self, candidate):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((candidate, future, time.perf_counter()))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self.slots.acquire()
+            asyncio.ensure_future(self._score_batch(batch))
+
+    async def _score_batch(self, batch):
+        try:
+            candidates_df = pd.DataFrame([candidate for candidate, _, _ in batch], columns=CANDIDATE_COLUMNS)
+            scored_df = await asyncio.get_running_loop().run_in_executor(
+                self.executor, score_candidates, candidates_df, self.model, self.origin_means, self.roastlevel_means)
+            results = scored_df.to_dict('records')
+        except Exception as error:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        finally:
+            self.slots.release()
+
+        finished = time.perf_counter()
+        self.requests += len(batch)
+        self.batches += 1
+        for (_, future, queued), result in zip(batch, results):
+            self.latencies.append(finished - queued)
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started
+        latencies_ms = np.array(self.latencies) * 1000
+        percentiles = np.percentile(latencies_ms, [50, 95, 99]) if len(latencies_ms) else [None] * 3
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch_size': self.requests / self.batches if self.batches else None,
+            'requests_per_second': self.requests / elapsed if elapsed else None,
+            'latency_ms': {'p50': percentiles[0], 'p95': percentiles[1], 'p99': percentiles[2]},
+        }
+
+
+def _prediction_json(result, classes):
+    # Candidates with an origin or roast level the model has not seen come back without a prediction
+    return {
+        'Origin': result['Origin'],
+        'RoastLevel': result['RoastLevel'],
+        'Price': result['Price'],
+        'Prediction': result['Prediction'],
+        'AdjustedPrediction': result['AdjustedPrediction'],
+        'Probabilities': None if result['Prediction'] is None else
+        {str(label): result[f'Probability_{label}'] for label in classes},
+    }
+
+
+# POST /predict with {"Origin": ..., "RoastLevel": ..., "Price": ...}, or {"candidates": [...]} for several
+class PredictHandler(tornado.web.RequestHandler):
+    def initialize(self, batcher):
+        self.batcher = batcher
+
+    async def post(self):
+        try:
+            body = json.loads(self.request.body)
+            candidates = body['candidates'] if 'candidates' in body else [body]
+            candidates = [{'Origin': c['Origin'], 'RoastLevel': c['RoastLevel'], 'Price': float(c['Price'])}
+                          for c in candidates]
+            # float() accepts 'nan' and 'inf', which the model can't score and JSON can't carry back
+            if not np.isfinite([c['Price'] for c in candidates]).all():
+                raise ValueError('Price must be a finite number')
+        except (ValueError, KeyError, TypeError) as error:
+            raise tornado.web.HTTPError(400, reason=f'Invalid request: {error}')
+
+        results = await asyncio.gather(*(self.batcher.predict(candidate) for candidate in candidates))
+        predictions = [_prediction_json(result, self.batcher.model.classes_) for result in results]
+        self.write({'predictions': predictions} if 'candidates' in body else predictions[0])
+
+
+class StatsHandler(tornado.web.RequestHandler):
+    def initialize(self, batcher):
+        self.batcher = batcher
+
+    def get(self):
+        self.write(self.batcher.stats())
+
+
+def make_app(batcher):
+    return tornado.web.Application([
+        (r'/predict', PredictHandler, {'batcher': batcher}),
+        (r'/stats', StatsHandler, {'batcher': batcher}),
+    ])
+
+
+# Client for the service, using only the standard library
+def predict_remote(url, origin, roast_level, price, timeout=5.0):
+    payload = json.dumps({'Origin': origin, 'RoastLevel': roast_level, 'Price': price}).encode()
+    request = urllib.request.Request(url.rstrip('/') + '/predict', data=payload,
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.load(response)
+
+
+async def serve(args):
+    model, origin_means, roastlevel_means = load_scoring_artifacts(args.models_dir)
+    batcher = MicroBatcher(model, origin_means, roastlevel_means, args.max_batch_size, args.max_wait_ms / 1000,
+                           args.workers)
+    make_app(batcher).listen(args.port, address=args.host)
+    print(f'Serving predictions on http://{args.host}:{args.port}')
+    await batcher.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve model predictions over HTTP with request micro-batching.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--models-dir', default='models')
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT_MS,
+                        help='How long the first request of a batch waits for others to join it.')
+    parser.add_argument('--workers', type=int, default=1, help='Batches scored concurrently.')
+    args = parser.parse_args()
+    asyncio.run(serve(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_processing import _write_atomic
+from scoring import adjust_predictions_for_price_outliers, encode_features, load_scoring_artifacts
+
+# Price grid of the estimator's slider
+PRICE_MIN = 5.0
+PRICE_MAX = 60.0
+PRICE_STEP = 0.5
+TABLE_FILE = 'prediction_table.npz'
+
+
+# Model output for every origin x roast level x price step, stored as a class-code array and a
+# probability array indexed [origin, roast level, price step]. Answering a request is an index lookup,
+# so the forest doesn't need to be loaded at all.
+class PredictionTable:
+    def __init__(self, origins, roast_levels, classes, price_min, price_step, class_codes, probabilities):
+        self.origins = np.asarray(origins)
+        self.roast_levels = np.asarray(roast_levels)
+        self.classes = np.asarray(classes)
+        self.price_min = float(price_min)
+        self.price_step = float(price_step)
+        self.class_codes = class_codes
+        self.probabilities = probabilities
+        self._origin_index = {origin: i for i, origin in enumerate(self.origins.tolist())}
+        self._roast_level_index = {roast_level: i for i, roast_level in enumerate(self.roast_levels.tolist())}
+
+    def _price_index(self, price):
+        steps = (price - self.price_min) / self.price_step
+        i = int(round(steps))
+        if abs(steps - i) > 1e-9 or not 0 <= i < self.class_codes.shape[2]:
+            return None
+        return i
+
+    # Returns (prediction, {class: probability}), or None when the input is not on the table's grid
+    def lookup(self, origin, roast_level, price):
+        i = self._origin_index.get(origin)
+        j = self._roast_level_index.get(roast_level)
+        k = self._price_index(price)
+        if i is None or j is None or k is None:
+            return None
+        prediction = self.classes[self.class_codes[i, j, k]]
+        return prediction, dict(zip(self.classes.tolist(), self.probabilities[i, j, k].tolist()))
+
+    # The whole price row for one origin and roast level, in the same layout as scoring.price_sweep; None
+    # when either is not in the table
+    def sweep(self, origin, roast_level):
+        i = self._origin_index.get(origin)
+        j = self._roast_level_index.get(roast_level)
+        if i is None or j is None:
+            return None
+        prices = self.price_min + self.price_step * np.arange(self.class_codes.shape[2])
+        predictions = self.classes[self.class_codes[i, j]].astype(object)
+        sweep_df = pd.DataFrame({'Origin': origin, 'RoastLevel': roast_level, 'Price': prices})
+        sweep_df['Prediction'] = predictions
+        sweep_df['AdjustedPrediction'] = adjust_predictions_for_price_outliers(predictions, prices)
+        for k, label in enumerate(self.classes.tolist()):
+            sweep_df[f'Probability_{label}'] = self.probabilities[i, j, :, k].astype(np.float64)
+        return sweep_df
+
+    def save(self, path):
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, origins=self.origins, roast_levels=self.roast_levels, classes=self.classes,
+                         price_grid=np.array([self.price_min, self.price_step]),
+                         class_codes=self.class_codes, probabilities=self.probabilities)
+        _write_atomic(path, write)
+
+    @staticmethod
+    def load(path):
+        with np.load(path, allow_pickle=False) as arrays:
+            price_min, price_step = arrays['price_grid']
+            return PredictionTable(arrays['origins'], arrays['roast_levels'], arrays['classes'], price_min,
+                                   price_step, arrays['class_codes'], arrays['probabilities'])
+
+
+# Every slider position from price_min to price_max
+def price_grid(price_min=PRICE_MIN, price_max=PRICE_MAX, price_step=PRICE_STEP):
+    return price_min + price_step * np.arange(int(round((price_max - price_min) / price_step)) + 1)
+
+
+def build_prediction_table(model, origin_means, roastlevel_means, price_min=PRICE_MIN, price_max=PRICE_MAX, price_step=PRICE_STEP):
+    origins = list(origin_means)
+    roast_levels = list(roastlevel_means)
+    prices = price_grid(price_min, price_max, price_step)
+
+    origin_grid, roast_level_grid, price_index_grid = np.meshgrid(np.arange(len(origins)), np.arange(len(roast_levels)),
+                                                                  np.arange(len(prices)), indexing='ij')
+    candidates_df = pd.DataFrame({
+        'Origin': np.asarray(origins, dtype=object)[origin_grid.ravel()],
+        'RoastLevel': np.asarray(roast_levels, dtype=object)[roast_level_grid.ravel()],
+        'Price': prices[price_index_grid.ravel()],
+    })
+    probabilities = model.predict_proba(encode_features(candidates_df, origin_means, roastlevel_means))
+
+    shape = (len(origins), len(roast_levels), len(prices))
+    class_codes = probabilities.argmax(axis=1).astype(np.int8).reshape(shape)
+    probabilities = probabilities.astype(np.float32).reshape(shape + (probabilities.shape[1],))
+    return PredictionTable(np.array(origins, dtype=str), np.array(roast_levels, dtype=str),
+                           np.array(model.classes_, dtype=str), price_min, price_step, class_codes, probabilities)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute the estimator prediction table from the trained model.')
+    parser.add_argument('--models-dir', default='models')
+    args = parser.parse_args()
+
+    model, origin_means, roastlevel_means = load_scoring_artifacts(args.models_dir)
+    table = build_prediction_table(model, origin_means, roastlevel_means)
+    path = os.path.join(args.models_dir, TABLE_FILE)
+    table.save(path)
+    print(f'Saved {table.class_codes.size} predictions to {path}')
+
+
+if __name__ == '__main__':
+    main()
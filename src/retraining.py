@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
+from joblib import Memory, load
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+
+from data_processing import DATA_DIR, data_signature
+from model_training import CACHE_DIR, FEATURES, MODELS_DIR, load_training_data, run_search, save_artifacts
+from scoring import encode_features
+
+VERSIONS_DIR = os.path.join(MODELS_DIR, 'versions')
+MANIFEST_FILE = 'manifest.json'
+# Relative change in any encoding or threshold below which the deployed model is kept as it is, and
+# above which the forest is refitted from scratch; in between, trees fitted on the new data are added
+SKIP_TOLERANCE = 0.05
+FULL_RETRAIN_TOLERANCE = 0.25
+DEFAULT_WARM_START_TREES = 50
+
+
+def _relative_change(old, new):
+    if old == new:
+        return 0.0
+    return abs(new - old) / max(abs(old), abs(new))
+
+
+# How far the encodings and thresholds built from the new data moved from the deployed ones
+def drift_report(manifest, origin_means, roastlevel_means, thresholds):
+    report = {'new_origins': sorted(set(origin_means) - set(manifest['origin_means'])),
+              'new_roast_levels': sorted(set(roastlevel_means) - set(manifest['roastlevel_means']))}
+    encoding_changes = [_relative_change(manifest[name][key], value)
+                        for name, means in (('origin_means', origin_means), ('roastlevel_means', roastlevel_means))
+                        for key, value in means.items() if key in manifest[name]]
+    report['max_encoding_change'] = max(encoding_changes, default=0.0)
+    report['max_threshold_change'] = max(_relative_change(old, new) for old, new in zip(manifest['thresholds'], thresholds))
+    return report
+
+
+# A warm start keeps the deployed encodings (the existing trees split on them), so it is only chosen when
+# they are still close to the new ones; the thresholds, i.e. the labels, are what it refreshes
+def choose_mode(manifest, signature, drift):
+    if manifest is None:
+        return 'full'
+    if manifest['data_signature'] == signature:
+        return 'skip'
+    if drift['new_origins'] or drift['new_roast_levels'] or drift['max_encoding_change'] >= SKIP_TOLERANCE:
+        return 'full'
+    if drift['max_threshold_change'] < SKIP_TOLERANCE:
+        return 'skip'
+    if drift['max_threshold_change'] < FULL_RETRAIN_TOLERANCE:
+        return 'warm'
+    return 'full'
+
+
+# Adds n_trees trees fitted on the new data to the deployed forest. The scaler is kept as it is, since the
+# existing trees split on features scaled by it.
+def warm_start(model, X_train, y_train, n_trees=DEFAULT_WARM_START_TREES):
+    scaler = model.named_steps['standardscaler']
+    forest = model.named_steps['randomforestclassifier']
+    if set(y_train) != set(forest.classes_):
+        raise ValueError('The new data does not have the classes the deployed forest was trained on')
+    forest.set_params(warm_start=True, n_estimators=len(forest.estimators_) + n_trees)
+    forest.fit(scaler.transform(X_train), y_train)
+    forest.set_params(warm_start=False)
+    return model
+
+
+def list_versions(versions_dir=VERSIONS_DIR):
+    if not os.path.isdir(versions_dir):
+        return []
+    return sorted(name for name in os.listdir(versions_dir)
+                  if os.path.exists(os.path.join(versions_dir, name, MANIFEST_FILE)))
+
+
+def load_manifest(version, versions_dir=VERSIONS_DIR):
+    with open(os.path.join(versions_dir, version, MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+def _new_version_dir(versions_dir):
+    version = time.strftime('%Y%m%dT%H%M%S')
+    suffix = 1
+    while os.path.exists(os.path.join(versions_dir, version)):
+        version = f"{time.strftime('%Y%m%dT%H%M%S')}-{suffix}"
+        suffix += 1
+    return version
+
+
+# Every trained model is kept in versions/<timestamp>/ with a manifest describing how it was made; the
+# deployed copy in models/ is written from it with the same save_artifacts the training script uses
+def save_version(model, origin_means, roastlevel_means, manifest, models_dir=MODELS_DIR, versions_dir=VERSIONS_DIR):
+    version = _new_version_dir(versions_dir)
+    version_dir = os.path.join(versions_dir, version)
+    save_artifacts(model, origin_means, roastlevel_means, version_dir)
+    manifest = dict(manifest, version=version, origin_means=origin_means, roastlevel_means=roastlevel_means,
+                    n_estimators=len(model.named_steps['randomforestclassifier'].estimators_))
+    with open(os.path.join(version_dir, MANIFEST_FILE), 'w') as f:
+        # Search parameters can be numpy scalars
+        json.dump(manifest, f, indent=2, default=lambda value: value.item())
+    promote(version, models_dir, versions_dir)
+    return version
+
+
+def promote(version, models_dir=MODELS_DIR, versions_dir=VERSIONS_DIR):
+    version_dir = os.path.join(versions_dir, version)
+    model = load(os.path.join(version_dir, 'your_model.joblib'))
+    origin_means = load(os.path.join(version_dir, 'origin_means.joblib'))
+    roastlevel_means = load(os.path.join(version_dir, 'roastlevel_means.joblib'))
+    save_artifacts(model, origin_means, roastlevel_means, models_dir)
+    shutil.copyfile(os.path.join(version_dir, MANIFEST_FILE), os.path.join(models_dir, MANIFEST_FILE))
+
+
+def deployed_manifest(models_dir=MODELS_DIR):
+    path = os.path.join(models_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def retrain(mode='auto', data_dir=DATA_DIR, models_dir=MODELS_DIR, versions_dir=VERSIONS_DIR, search='grid',
+            n_jobs=-1, warm_start_trees=DEFAULT_WARM_START_TREES, use_cache=True):
+    signature = json.loads(json.dumps(data_signature(data_dir)))
+    final_df, origin_means, roastlevel_means, thresholds = load_training_data(data_dir, use_cache=use_cache)
+    manifest = deployed_manifest(models_dir)
+    drift = drift_report(manifest, origin_means, roastlevel_means, thresholds) if manifest is not None else None
+    if mode == 'auto':
+        mode = choose_mode(manifest, signature, drift)
+    elif mode == 'warm' and manifest is None:
+        raise ValueError(f'There is no deployed model in {models_dir} to warm-start from')
+    if mode == 'skip':
+        return None, mode, drift
+    if mode == 'warm':
+        if drift['new_origins'] or drift['new_roast_levels']:
+            raise ValueError('The deployed encodings have no value for some origins or roast levels; use a full retrain')
+        # The kept trees were fitted on the deployed encodings, so the new trees are too and they stay deployed
+        origin_means, roastlevel_means = manifest['origin_means'], manifest['roastlevel_means']
+        final_df = final_df.assign(**encode_features(final_df, origin_means, roastlevel_means))
+
+    X_train, X_test, y_train, y_test = train_test_split(final_df[FEATURES], final_df['PerformanceCategory'],
+                                                        random_state=42)
+    start = time.perf_counter()
+    if mode == 'warm':
+        model = warm_start(load(os.path.join(models_dir, 'your_model.joblib')), X_train, y_train, warm_start_trees)
+        # The searched parameters as the forest now has them (n_estimators includes the added trees)
+        params = {name: model.get_params()[name] for name in manifest['params']}
+    else:
+        memory = Memory(os.path.join(CACHE_DIR, 'pipeline'), verbose=0) if use_cache else None
+        model, params, _, _ = run_search(X_train, y_train, search, n_jobs, memory=memory)
+        model.set_params(memory=None)
+
+    version_manifest = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'mode': mode,
+        'parent': manifest['version'] if manifest is not None else None,
+        'data_signature': signature,
+        'thresholds': list(thresholds),
+        'params': params,
+        'training_seconds': time.perf_counter() - start,
+        'test_accuracy': accuracy_score(y_test, model.predict(X_test)),
+        'drift': drift,
+    }
+    version = save_version(model, origin_means, roastlevel_means, version_manifest, models_dir, versions_dir)
+    return version, mode, drift
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Refresh the model when the data has drifted, keeping every version.')
+    parser.add_argument('--mode', choices=['auto', 'skip', 'warm', 'full'], default='auto',
+                        help='auto picks from the drift in the encodings and thresholds; the others force a mode.')
+    parser.add_argument('--search', choices=['grid', 'halving', 'random'], default='grid',
+                        help='Search used for a full retrain.')
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--warm-start-trees', type=int, default=DEFAULT_WARM_START_TREES,
+                        help='Trees added to the forest by a warm start.')
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--list', action='store_true', help='List the saved versions and exit.')
+    parser.add_argument('--promote', metavar='VERSION', help='Deploy a saved version (e.g. to roll back) and exit.')
+    args = parser.parse_args()
+
+    if args.list:
+        deployed = deployed_manifest()
+        for version in list_versions():
+            manifest = load_manifest(version)
+            marker = '*' if deployed is not None and deployed['version'] == version else ' '
+            print(f"{marker} {version}  {manifest['mode']:<5} trees={manifest['n_estimators']:<4} "
+                  f"test_accuracy={manifest['test_accuracy']:.3f}")
+        return
+    if args.promote:
+        promote(args.promote)
+        print(f'Deployed {args.promote}')
+        return
+
+    version, mode, drift = retrain(args.mode, search=args.search, n_jobs=args.n_jobs,
+                                   warm_start_trees=args.warm_start_trees, use_cache=not args.no_cache)
+    if drift is not None:
+        print('Drift:', json.dumps(drift))
+    if version is None:
+        print('No meaningful change in the data; keeping the deployed model')
+    else:
+        print(f'Saved and deployed {version} ({mode})')
+
+
+if __name__ == '__main__':
+    main()
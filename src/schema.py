@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+# Bumped whenever a schema below changes, so frames cached under an older schema are rebuilt
+SCHEMA_VERSION = 1
+
+# Column dtypes for the three datasets. Low-cardinality text is categorical and integer IDs and counts
+# are downcast; money stays float64 so prices with cents load unchanged. Free text (names) stays object.
+PRODUCTS_SCHEMA = {
+    'ProductID': 'int32',
+    'ProductName': 'object',
+    'Category': 'category',
+    'LaunchDate': 'datetime64[ns]',
+    'Price': 'float64',
+    'Origin': 'category',
+    'RoastLevel': 'category',
+}
+CUSTOMERS_SCHEMA = {
+    'CustomerID': 'int32',
+    'CustomerName': 'object',
+    'Location': 'category',
+    'Gender': 'category',
+}
+SALES_SCHEMA = {
+    'ProductID': 'int32',
+    'SaleDate': 'datetime64[ns]',
+    'Quantity': 'int16',
+    'TotalSaleAmount': 'float64',
+    'CustomerID': 'int32',
+}
+
+
+def _to_integer(values, dtype, column):
+    if values.isna().any():
+        raise ValueError(f'Column {column} has missing values but must be {dtype}')
+    try:
+        numbers = pd.to_numeric(values)
+    except (TypeError, ValueError) as error:
+        raise ValueError(f'Column {column} cannot be converted to {dtype}: {error}') from error
+    if not np.array_equal(numbers, np.round(numbers)):
+        raise ValueError(f'Column {column} has non-integer values but must be {dtype}')
+    limits = np.iinfo(dtype)
+    if len(numbers) and (numbers.min() < limits.min or numbers.max() > limits.max):
+        raise ValueError(f'Column {column} has values outside the {dtype} range')
+    return numbers.astype(dtype)
+
+
+def _to_dtype(values, dtype, column):
+    if dtype.startswith('int'):
+        return _to_integer(values, dtype, column)
+    try:
+        if dtype == 'category':
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                # Database enums come back ordered; the datasets' categories have no order
+                return values.cat.as_unordered() if values.dtype.ordered else values
+            return values.astype('category')
+        if dtype.startswith('datetime64'):
+            return pd.to_datetime(values).astype(dtype)
+        if dtype == 'object':
+            return values.astype(object)
+        return pd.to_numeric(values).astype(dtype)
+    except (TypeError, ValueError) as error:
+        raise ValueError(f'Column {column} cannot be converted to {dtype}: {error}') from error
+
+
+# Returns df with the schema's columns converted (other columns are kept as they are). Raises ValueError
+# when a column is missing or its values don't fit the schema's dtype, instead of silently truncating.
+def enforce_schema(df, schema, name='frame'):
+    missing = [column for column in schema if column not in df.columns]
+    if missing:
+        raise ValueError(f'{name} is missing columns: {missing}')
+    try:
+        columns = {column: _to_dtype(df[column], schema[column], column) if column in schema else df[column]
+                   for column in df.columns}
+    except ValueError as error:
+        raise ValueError(f'{name}: {error}') from error
+    return pd.DataFrame(columns, index=df.index)
@@ -0,0 +1,141 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from joblib import load
+
+FEATURES = ['Origin_TargetEncoded', 'RoastLevel_TargetEncoded', 'Price']
+CANDIDATE_COLUMNS = ['Origin', 'RoastLevel', 'Price']
+HIGH_PRICE_THRESHOLD = 40
+LOW_PRICE_THRESHOLD = 10
+DEFAULT_BATCH_SIZE = 50_000
+
+
+# Function to adjust the prediction based on price outliers
+def adjust_prediction_for_price_outliers(prediction, price, high_price_threshold=HIGH_PRICE_THRESHOLD, low_price_threshold=LOW_PRICE_THRESHOLD):
+    if price > high_price_threshold:
+        return 'Low'
+    elif price < low_price_threshold:
+        return 'High'
+    else:
+        return prediction
+
+
+# Same rule as adjust_prediction_for_price_outliers, applied to whole arrays with masks
+def adjust_predictions_for_price_outliers(predictions, prices, high_price_threshold=HIGH_PRICE_THRESHOLD, low_price_threshold=LOW_PRICE_THRESHOLD):
+    prices = np.asarray(prices)
+    adjusted = np.array(predictions, dtype=object)
+    adjusted[prices > high_price_threshold] = 'Low'
+    adjusted[prices < low_price_threshold] = 'High'
+    return adjusted
+
+
+def encode_features(candidates_df, origin_means, roastlevel_means):
+    return pd.DataFrame({
+        'Origin_TargetEncoded': candidates_df['Origin'].map(origin_means).astype(float),
+        'RoastLevel_TargetEncoded': candidates_df['RoastLevel'].map(roastlevel_means).astype(float),
+        'Price': candidates_df['Price'].astype(float),
+    }, index=candidates_df.index)
+
+
+# Scores candidates with one predict_proba call per batch; the predicted class is the most probable one,
+# as in RandomForestClassifier.predict. Rows with an origin or roast level the model has not seen get no
+# prediction.
+def score_candidates(candidates_df, model, origin_means, roastlevel_means, batch_size=DEFAULT_BATCH_SIZE):
+    features = encode_features(candidates_df, origin_means, roastlevel_means)
+    known = features.notna().all(axis=1).to_numpy()
+    classes = np.asarray(model.classes_)
+    probabilities = np.full((len(features), len(classes)), np.nan)
+
+    known_positions = np.flatnonzero(known)
+    for start in range(0, len(known_positions), batch_size):
+        positions = known_positions[start:start + batch_size]
+        probabilities[positions] = model.predict_proba(features.iloc[positions])
+
+    predictions = np.full(len(features), None, dtype=object)
+    predictions[known] = classes[probabilities[known].argmax(axis=1)]
+    adjusted = adjust_predictions_for_price_outliers(predictions, features['Price'].to_numpy())
+    adjusted[~known] = None
+
+    scored_df = candidates_df[CANDIDATE_COLUMNS].copy()
+    # Always float, so chunks of whole-number prices write the same column type as the rest
+    scored_df['Price'] = features['Price']
+    scored_df['Prediction'] = predictions
+    scored_df['AdjustedPrediction'] = adjusted
+    for i, label in enumerate(classes):
+        scored_df[f'Probability_{label}'] = probabilities[:, i]
+    return scored_df
+
+
+# What-if curve for one origin and roast level across a range of prices: the whole grid goes through a
+# single predict_proba call and the masked price-outlier rule, as in score_candidates
+def price_sweep(model, origin, roast_level, prices, origin_means, roastlevel_means):
+    prices = np.asarray(prices, dtype=float)
+    candidates_df = pd.DataFrame({'Origin': origin, 'RoastLevel': roast_level, 'Price': prices})
+    return score_candidates(candidates_df, model, origin_means, roastlevel_means, batch_size=max(len(prices), 1))
+
+
+def load_scoring_artifacts(models_dir='models'):
+    model = load(os.path.join(models_dir, 'your_model.joblib'))
+    origin_means = load(os.path.join(models_dir, 'origin_means.joblib'))
+    roastlevel_means = load(os.path.join(models_dir, 'roastlevel_means.joblib'))
+    return model, origin_means, roastlevel_means
+
+
+def iter_candidate_chunks(path, chunksize):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        yield from pd.read_csv(path, usecols=CANDIDATE_COLUMNS, chunksize=chunksize)
+    elif extension == '.parquet':
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=CANDIDATE_COLUMNS):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f'Unsupported candidate file type: {path}')
+
+
+# Reads, scores and writes one chunk at a time so catalogues of any size stream through
+def score_file(input_path, output_path, model, origin_means, roastlevel_means, batch_size=DEFAULT_BATCH_SIZE):
+    output_extension = os.path.splitext(output_path)[1].lower()
+    if output_extension not in ('.csv', '.parquet'):
+        raise ValueError(f'Unsupported output file type: {output_path}')
+
+    parquet_writer = None
+    n_rows = 0
+    try:
+        for chunk_df in iter_candidate_chunks(input_path, batch_size):
+            scored_df = score_candidates(chunk_df, model, origin_means, roastlevel_means, batch_size)
+            if output_extension == '.csv':
+                scored_df.to_csv(output_path, mode='w' if n_rows == 0 else 'a', header=n_rows == 0, index=False)
+            else:
+                table = pa.Table.from_pandas(scored_df, preserve_index=False)
+                if parquet_writer is None:
+                    # A chunk without any known rows has all-null prediction columns; store them as strings
+                    schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                                        for field in table.schema])
+                    parquet_writer = pq.ParquetWriter(output_path, schema)
+                parquet_writer.write_table(table.cast(parquet_writer.schema))
+            n_rows += len(scored_df)
+    finally:
+        if parquet_writer is not None:
+            parquet_writer.close()
+    return n_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score a catalogue of candidate beans (Origin, RoastLevel, Price).')
+    parser.add_argument('input', help='CSV or Parquet file of candidates.')
+    parser.add_argument('output', help='CSV or Parquet file to write the scored candidates to.')
+    parser.add_argument('--models-dir', default='models')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    model, origin_means, roastlevel_means = load_scoring_artifacts(args.models_dir)
+    n_rows = score_file(args.input, args.output, model, origin_means, roastlevel_means, args.batch_size)
+    print(f'Scored {n_rows} candidates into {args.output}')
+
+
+if __name__ == '__main__':
+    main()
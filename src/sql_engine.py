@@ -0,0 +1,156 @@
+import json
+import os
+import sqlite3
+
+import pandas as pd
+
+from data_processing import DATA_DIR, DATA_FILES, assemble_final_df, data_signature, read_excel_cached
+from schema import PRODUCTS_SCHEMA, enforce_schema
+from streaming import DEFAULT_CHUNKSIZE, iter_sales_chunks
+
+# Aggregates behind preprocess_data, kept as materialised tables. YearMonth is an integer month number
+# (year * 12 + month - 1) computed at ingest, so the same SQL runs on DuckDB and SQLite. Sales without
+# a date have no YearMonth and, as in preprocess_data, count towards Quantity but not SalesShare.
+MATERIALISED_VIEWS = {
+    'monthly_sales': '''
+        SELECT YearMonth, CAST(SUM(Quantity) AS BIGINT) AS TotalMonthlySales
+        FROM sales WHERE YearMonth IS NOT NULL GROUP BY YearMonth''',
+    'product_quantity': '''
+        SELECT ProductID, CAST(SUM(Quantity) AS BIGINT) AS Quantity FROM sales GROUP BY ProductID''',
+    'product_share': '''
+        SELECT s.ProductID, AVG(CAST(s.Quantity AS DOUBLE) / m.TotalMonthlySales) AS SalesShare
+        FROM sales s JOIN monthly_sales m ON s.YearMonth = m.YearMonth GROUP BY s.ProductID''',
+}
+# Column types of final_df as preprocess_data builds it. The backends hand back their own types (DuckDB
+# enums, SQLite text dates, 64-bit integers), so frames read from the database are converted to these.
+FINAL_SCHEMA = dict(PRODUCTS_SCHEMA, Quantity='int64', MonthsOnMarket_x='int32', MonthsOnMarket_y='int32')
+
+
+def default_backend():
+    try:
+        import duckdb  # noqa: F401
+    except ImportError:
+        return 'sqlite'
+    return 'duckdb'
+
+
+# Ingests the three datasets into a local embedded database once (again only when the Excel files
+# change) and answers preprocess_data and the roast-level queries in SQL. Sales are streamed in
+# chunks, so the raw transactions never sit in Python memory. DuckDB is used when it is installed
+# (multi-threaded, spills to disk); otherwise the standard library's SQLite.
+class SqlEngine:
+    def __init__(self, database=None, backend=None, data_dir=DATA_DIR):
+        self.backend = backend or default_backend()
+        self.data_dir = data_dir
+        if database is None:
+            database = os.path.join(data_dir, 'cache', 'coffee.duckdb' if self.backend == 'duckdb' else 'coffee.sqlite')
+        os.makedirs(os.path.dirname(database) or '.', exist_ok=True)
+
+        if self.backend == 'duckdb':
+            import duckdb
+            self.connection = duckdb.connect(database)
+        elif self.backend == 'sqlite':
+            self.connection = sqlite3.connect(database)
+        else:
+            raise ValueError(f'Unknown SQL backend: {self.backend}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def execute(self, sql, params=()):
+        return self.connection.execute(sql, params)
+
+    def query(self, sql, params=()):
+        if self.backend == 'duckdb':
+            return self.connection.execute(sql, params).df()
+        return pd.read_sql_query(sql, self.connection, params=params)
+
+    def _table_exists(self, name):
+        if self.backend == 'duckdb':
+            sql = 'SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?'
+        else:
+            sql = "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?"
+        return self.execute(sql, (name,)).fetchone()[0] > 0
+
+    def _write_frame(self, name, df, replace=True):
+        if self.backend == 'duckdb':
+            self.connection.register('frame_to_write', df)
+            if replace:
+                self.execute(f'CREATE OR REPLACE TABLE {name} AS SELECT * FROM frame_to_write')
+            else:
+                self.execute(f'INSERT INTO {name} SELECT * FROM frame_to_write')
+            self.connection.unregister('frame_to_write')
+        else:
+            df.to_sql(name, self.connection, if_exists='replace' if replace else 'append', index=False)
+
+    def _ingested_signature(self):
+        if not self._table_exists('ingest_meta'):
+            return None
+        return self.execute('SELECT signature FROM ingest_meta').fetchone()[0]
+
+    def ingest(self, chunksize=DEFAULT_CHUNKSIZE):
+        products_path, customers_path, sales_path = (os.path.join(self.data_dir, name) for name in DATA_FILES)
+        self._write_frame('products', read_excel_cached(products_path))
+        self._write_frame('customers', read_excel_cached(customers_path))
+
+        self.execute('DROP TABLE IF EXISTS sales')
+        self.execute('CREATE TABLE sales (ProductID BIGINT, SaleDate TIMESTAMP, Quantity BIGINT, YearMonth INTEGER)')
+        for chunk_df in iter_sales_chunks(sales_path, chunksize):
+            sale_dates = chunk_df['SaleDate']
+            chunk_df = chunk_df.assign(YearMonth=(sale_dates.dt.year * 12 + sale_dates.dt.month - 1).astype('Int64'))
+            self._write_frame('sales', chunk_df[['ProductID', 'SaleDate', 'Quantity', 'YearMonth']], replace=False)
+        self.execute('CREATE INDEX sales_product ON sales (ProductID)')
+        self.execute('CREATE INDEX sales_month ON sales (YearMonth)')
+
+        for name, sql in MATERIALISED_VIEWS.items():
+            self.execute(f'DROP TABLE IF EXISTS {name}')
+            self.execute(f'CREATE TABLE {name} AS {sql}')
+
+        # final_df is stored too, so the roast-level queries run against it with an index
+        final_df = self._assemble_final_df()
+        self._write_frame('final', final_df)
+        self.execute('CREATE INDEX final_roast_level ON final (RoastLevel)')
+
+        self._write_frame('ingest_meta', pd.DataFrame({'signature': [json.dumps(data_signature(self.data_dir))]}))
+        if self.backend == 'sqlite':
+            self.connection.commit()
+
+    def ensure_ingested(self):
+        if self._ingested_signature() != json.dumps(data_signature(self.data_dir)):
+            self.ingest()
+
+    def _assemble_final_df(self):
+        product_quantity = enforce_schema(self.query('SELECT ProductID, Quantity FROM product_quantity ORDER BY ProductID'),
+                                          {'ProductID': 'int32', 'Quantity': 'int64'}, 'product_quantity')
+        product_share = enforce_schema(self.query('SELECT ProductID, SalesShare FROM product_share ORDER BY ProductID'),
+                                       {'ProductID': 'int32', 'SalesShare': 'float64'}, 'product_share')
+        coffee_products_df = enforce_schema(self.query('SELECT * FROM products'), PRODUCTS_SCHEMA, 'products')
+        return assemble_final_df(product_quantity.set_index('ProductID')['Quantity'],
+                                 product_share.set_index('ProductID')['SalesShare'], coffee_products_df)
+
+    def final_df(self):
+        self.ensure_ingested()
+        return self._assemble_final_df()
+
+    # Same result as preprocess_for_roastlevel_analysis
+    def roastlevel_analysis(self, roast_level):
+        self.ensure_ingested()
+        roastlevel_analysis = self.query('''
+            SELECT Origin, AVG(AvgMonthlySales) AS AvgMonthlySales FROM final
+            WHERE RoastLevel = ? AND AvgMonthlySales IS NOT NULL
+            GROUP BY Origin ORDER BY AvgMonthlySales DESC''', (roast_level,))
+        return enforce_schema(roastlevel_analysis, {'Origin': 'category'}, 'roastlevel_analysis')
+
+    # Same result as preprocess_for_roast_top10
+    def top_products(self, roast_level, top_n=10):
+        self.ensure_ingested()
+        top_products = self.query('''
+            SELECT * FROM final WHERE RoastLevel = ? AND AvgMonthlySales IS NOT NULL
+            ORDER BY AvgMonthlySales DESC LIMIT ?''', (roast_level, top_n))
+        return enforce_schema(top_products, FINAL_SCHEMA, 'top_products')
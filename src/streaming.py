@@ -0,0 +1,77 @@
+import os
+
+import pandas as pd
+import pyarrow.parquet as pq
+from openpyxl import load_workbook
+
+from incremental import SalesAggregator
+from schema import SALES_SCHEMA, enforce_schema
+
+# The only sales columns the per-product and per-month aggregates need
+SALES_COLUMNS = ['ProductID', 'SaleDate', 'Quantity']
+DEFAULT_CHUNKSIZE = 100_000
+
+
+def _sales_chunk_frame(rows, columns):
+    chunk_df = pd.DataFrame(rows, columns=columns)
+    if 'SaleDate' in chunk_df:
+        chunk_df['SaleDate'] = pd.to_datetime(chunk_df['SaleDate'])
+    return chunk_df
+
+
+# Read-only openpyxl iterates rows lazily instead of loading the whole sheet
+def _iter_excel_chunks(path, chunksize, columns):
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = list(next(rows))
+        missing = [column for column in columns if column not in header]
+        if missing:
+            raise ValueError(f'{path} is missing columns: {missing}')
+        positions = [header.index(column) for column in columns]
+
+        chunk = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            chunk.append([row[i] for i in positions])
+            if len(chunk) == chunksize:
+                yield _sales_chunk_frame(chunk, columns)
+                chunk = []
+        if chunk:
+            yield _sales_chunk_frame(chunk, columns)
+    finally:
+        workbook.close()
+
+
+# Every chunk is checked against the sales schema and converted to it
+def iter_sales_chunks(path, chunksize=DEFAULT_CHUNKSIZE, columns=SALES_COLUMNS):
+    schema = {column: SALES_SCHEMA[column] for column in columns if column in SALES_SCHEMA}
+    for chunk_df in _iter_raw_sales_chunks(path, chunksize, columns):
+        yield enforce_schema(chunk_df, schema, os.path.basename(path))
+
+
+def _iter_raw_sales_chunks(path, chunksize, columns):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        yield from pd.read_csv(path, usecols=columns, parse_dates=['SaleDate'], chunksize=chunksize)
+    elif extension == '.parquet':
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    elif extension in ('.xlsx', '.xlsm'):
+        yield from _iter_excel_chunks(path, chunksize, columns)
+    else:
+        raise ValueError(f'Unsupported sales file type: {path}')
+
+
+# Single pass over the sales file; peak memory is one chunk plus the product x month state
+def aggregate_sales_stream(path, chunksize=DEFAULT_CHUNKSIZE, aggregator=None):
+    if aggregator is None:
+        aggregator = SalesAggregator()
+    for chunk_df in iter_sales_chunks(path, chunksize):
+        aggregator.update(chunk_df)
+    return aggregator
+
+
+def preprocess_data_streaming(coffee_products_df, sales_path, chunksize=DEFAULT_CHUNKSIZE):
+    return aggregate_sales_stream(sales_path, chunksize).final_df(coffee_products_df)
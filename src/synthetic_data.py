@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_processing import DATA_FILES
+
+# Synthetic products, customers and sales with the same columns and dtypes as the three Excel files
+ORIGINS = ['Brazil', 'Vietnam', 'Indonesia', 'Colombia', 'Ethiopia', 'Guatemala', 'Costa Rica', 'Jamaica',
+           'Hawaii', 'India', 'Yemen', 'Panama', 'Tanzania', 'Kenya', 'Nicaragua', 'Peru', 'Laos', 'Rwanda']
+ROAST_LEVELS = ['Light', 'Medium', 'Dark']
+LOCATIONS = ['Hai Phong', 'Ho Chi Minh City', 'Hue', 'Nha Trang', 'Binh Duong', 'Can Tho', 'Hanoi', 'Vinh',
+             'Quang Ninh', 'Da Nang']
+GENDERS = ['Undisclosed', 'Male', 'Female']
+START_DATE = pd.Timestamp('2022-01-01')
+END_DATE = pd.Timestamp('2023-12-31')
+
+
+def generate_products(n_products, rng):
+    origins = rng.choice(ORIGINS, n_products)
+    roast_levels = rng.choice(ROAST_LEVELS, n_products, p=[0.2, 0.65, 0.15])
+    # Launch at least one month before END_DATE so MonthsOnMarket is never zero
+    launch_span = (END_DATE - pd.DateOffset(months=1) - START_DATE).days
+    launch_dates = START_DATE + pd.to_timedelta(rng.integers(0, launch_span, n_products), unit='D')
+    return pd.DataFrame({
+        'ProductID': np.arange(1, n_products + 1),
+        'ProductName': [f'{origin} {roast} #{i}' for i, (origin, roast) in enumerate(zip(origins, roast_levels), 1)],
+        'Category': 'Coffee',
+        'LaunchDate': launch_dates,
+        'Price': rng.integers(12, 41, n_products),
+        'Origin': origins,
+        'RoastLevel': roast_levels,
+    })
+
+
+def generate_customers(n_customers, rng):
+    return pd.DataFrame({
+        'CustomerID': np.arange(1, n_customers + 1),
+        'CustomerName': [f'Customer {i}' for i in range(1, n_customers + 1)],
+        'Location': rng.choice(LOCATIONS, n_customers),
+        'Gender': rng.choice(GENDERS, n_customers),
+    })
+
+
+def generate_sales(coffee_products_df, n_customers, n_sales, rng):
+    product_index = rng.integers(0, len(coffee_products_df), n_sales)
+    launch_dates = coffee_products_df['LaunchDate'].to_numpy()[product_index]
+    # Each sale falls somewhere between its product's launch and END_DATE
+    days_on_market = (END_DATE.to_datetime64() - launch_dates) // np.timedelta64(1, 'D')
+    sale_dates = launch_dates + (rng.random(n_sales) * days_on_market).astype('int64').astype('timedelta64[D]')
+    quantity = rng.integers(1, 6, n_sales)
+    return pd.DataFrame({
+        'ProductID': coffee_products_df['ProductID'].to_numpy()[product_index],
+        'SaleDate': sale_dates,
+        'Quantity': quantity,
+        'TotalSaleAmount': quantity * coffee_products_df['Price'].to_numpy()[product_index],
+        'CustomerID': rng.integers(1, n_customers + 1, n_sales),
+    })
+
+
+def generate_data(n_products=26, n_customers=514, n_sales=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    coffee_products_df = generate_products(n_products, rng)
+    customers_data_df = generate_customers(n_customers, rng)
+    sales_data_df = generate_sales(coffee_products_df, n_customers, n_sales, rng)
+    return coffee_products_df, customers_data_df, sales_data_df
+
+
+# Writes the frames as the three Excel inputs load_data expects
+def write_excel(data_dir, coffee_products_df, customers_data_df, sales_data_df):
+    os.makedirs(data_dir, exist_ok=True)
+    for name, df in zip(DATA_FILES, (coffee_products_df, customers_data_df, sales_data_df)):
+        df.to_excel(os.path.join(data_dir, name), index=False, engine='openpyxl')
@@ -14,18 +14,10 @@ from sklearn.metrics import classification_report
 
 print("Current Working Directory:", os.getcwd())
 
-# Load data
-coffee_products_df = pd.read_excel('data/Coffee_Products.xlsx', engine='openpyxl')
-customers_data_df = pd.read_excel('data/Customers_Data.xlsx', engine='openpyxl')
-sales_data_df = pd.read_excel('data/Sales_Data.xlsx', engine='openpyxl')
-
-
-
-
 import pandas as pd
 import numpy as np
 import os
-import streamlit as st  # Import Streamlit
+from data_processing import load_data
 from joblib import dump
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
@@ -34,26 +26,6 @@ from sklearn.pipeline import make_pipeline
 from sklearn.model_selection import GridSearchCV
 from sklearn.metrics import classification_report
 
-def load_data():
-    # Check if running in Streamlit environment
-    if 'st' in globals():
-        # Use Streamlit session state to cache the data
-        if 'coffee_products_df' not in st.session_state:
-            st.session_state.coffee_products_df = pd.read_excel('data/Coffee_Products.xlsx', engine='openpyxl')
-        if 'customers_data_df' not in st.session_state:
-            st.session_state.customers_data_df = pd.read_excel('data/Customers_Data.xlsx', engine='openpyxl')
-        if 'sales_data_df' not in st.session_state:
-            st.session_state.sales_data_df = pd.read_excel('data/Sales_Data.xlsx', engine='openpyxl')
-        # Return data from session state
-        return st.session_state.coffee_products_df, st.session_state.customers_data_df, st.session_state.sales_data_df
-    else:
-        # Directly load data if not in Streamlit environment
-        return (
-            pd.read_excel('data/Coffee_Products.xlsx', engine='openpyxl'),
-            pd.read_excel('data/Customers_Data.xlsx', engine='openpyxl'),
-            pd.read_excel('data/Sales_Data.xlsx', engine='openpyxl')
-        )
-
 # Use the load_data function
 coffee_products_df, customers_data_df, sales_data_df = load_data()
 